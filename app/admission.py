@@ -0,0 +1,341 @@
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from fastapi import HTTPException, Request
+from fastapi.responses import JSONResponse
+from app.routes.auth import username_from_token
+
+# Token buckets for expensive analysis endpoints (rates are requests per second)
+ADMISSION_GLOBAL_RATE = float(os.getenv("ADMISSION_GLOBAL_RATE", "2"))
+ADMISSION_GLOBAL_BURST = float(os.getenv("ADMISSION_GLOBAL_BURST", "10"))
+ADMISSION_USER_RATE = float(os.getenv("ADMISSION_USER_RATE", "0.2"))
+ADMISSION_USER_BURST = float(os.getenv("ADMISSION_USER_BURST", "3"))
+ADMISSION_MAX_TRACKED_USERS = int(os.getenv("ADMISSION_MAX_TRACKED_USERS", "10000"))
+
+# Concurrency scheduling across all routes
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64"))
+ADMISSION_MAX_EXPENSIVE_CONCURRENCY = int(os.getenv("ADMISSION_MAX_EXPENSIVE_CONCURRENCY", "4"))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "128"))
+ADMISSION_QUEUE_TIMEOUT_S = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_S", "10"))
+
+# Long-running routes (concept extraction, Gemini, bulk export) scheduled behind interactive ones
+EXPENSIVE_PATHS = {
+    "/notes/detailed-note-analysis",
+    "/notes/analyze-concepts-enhanced",
+    "/notes/class-detailed-analysis",
+    "/notes/export",
+}
+
+# Expensive routes charged against the token buckets. The buckets are checked before a
+# request may queue for a scheduler slot, so a user over quota cannot fill the queue.
+RATE_LIMITED_PATHS = {
+    "/notes/detailed-note-analysis",
+    "/notes/analyze-concepts-enhanced",
+    "/notes/class-detailed-analysis",
+}
+
+# Expensive routes that answer If-None-Match revalidations with a cheap 304. Conditional
+# requests to them start in an interactive slot; on an ETag miss the handler is charged
+# and moves to an expensive slot (claim_expensive_slot) before doing the real work.
+CONDITIONAL_PATHS = {
+    "/notes/analyze-concepts-enhanced",
+}
+
+# Key under scope["state"] (request.state) holding the request's scheduler slot
+ADMISSION_SLOT_KEY = "admission_slot"
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_EXPENSIVE = 1
+
+
+class Overloaded(Exception):
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def retry_after_header(seconds: float) -> Dict[str, str]:
+    return {"Retry-After": str(max(1, math.ceil(seconds)))}
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `rate` tokens per second, holding at most `capacity`.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def check(self, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Refill, then report (enough tokens, seconds until enough tokens) without taking any.
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if self.tokens >= cost:
+            return True, 0.0
+        return False, (cost - self.tokens) / self.rate if self.rate > 0 else ADMISSION_QUEUE_TIMEOUT_S
+
+    def try_acquire(self, cost: float = 1.0) -> Tuple[bool, float]:
+        """
+        Take `cost` tokens if available. Returns (admitted, seconds until enough tokens).
+        """
+        admitted, wait = self.check(cost)
+        if admitted:
+            self.tokens -= cost
+        return admitted, wait
+
+
+class AdmissionController:
+    """
+    Per-user and global token buckets guarding the expensive analysis endpoints.
+    """
+
+    def __init__(self):
+        self.global_bucket = TokenBucket(ADMISSION_GLOBAL_RATE, ADMISSION_GLOBAL_BURST)
+        self.user_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self.rejected_user = 0
+        self.rejected_global = 0
+
+    def _user_bucket(self, username: str) -> TokenBucket:
+        bucket = self.user_buckets.get(username)
+        if bucket is None:
+            bucket = TokenBucket(ADMISSION_USER_RATE, ADMISSION_USER_BURST)
+            self.user_buckets[username] = bucket
+            # Forget the least recently seen users so memory stays bounded.
+            while len(self.user_buckets) > ADMISSION_MAX_TRACKED_USERS:
+                self.user_buckets.popitem(last=False)
+        else:
+            self.user_buckets.move_to_end(username)
+        return bucket
+
+    def admit(self, username: str):
+        # Check both buckets before taking from either, so a global rejection does not
+        # also cost the user a token. The user's bucket goes first so one user cannot
+        # drain global capacity.
+        user_bucket = self._user_bucket(username)
+        admitted, wait = user_bucket.check()
+        if not admitted:
+            self.rejected_user += 1
+            raise Overloaded("Too many analysis requests for this user", wait)
+        admitted, wait = self.global_bucket.check()
+        if not admitted:
+            self.rejected_global += 1
+            raise Overloaded("Analysis capacity exhausted, please retry shortly", wait)
+        user_bucket.tokens -= 1
+        self.global_bucket.tokens -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "tracked_users": len(self.user_buckets),
+            "global_tokens": self.global_bucket.tokens,
+            "rejected_user": self.rejected_user,
+            "rejected_global": self.rejected_global,
+        }
+
+
+class PriorityScheduler:
+    """
+    Bounded priority queue in front of request handling. Interactive routes are
+    dispatched before queued analysis requests, and analysis requests may only
+    occupy `max_expensive` of the `max_concurrency` slots.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = ADMISSION_MAX_CONCURRENCY,
+        max_expensive: int = ADMISSION_MAX_EXPENSIVE_CONCURRENCY,
+        max_queue: int = ADMISSION_MAX_QUEUE,
+        queue_timeout: float = ADMISSION_QUEUE_TIMEOUT_S
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_expensive = max_expensive
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.active_expensive = 0
+        self.rejected = 0
+        self._waiters: List[list] = []  # heap of [priority, seq, future, expensive]
+        self._seq = itertools.count()
+
+    def _can_run(self, expensive: bool) -> bool:
+        if self.active >= self.max_concurrency:
+            return False
+        return not expensive or self.active_expensive < self.max_expensive
+
+    def _grant(self, expensive: bool):
+        self.active += 1
+        if expensive:
+            self.active_expensive += 1
+
+    async def acquire(self, expensive: bool):
+        if self._can_run(expensive):
+            self._grant(expensive)
+            return
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded("Server is busy, please retry shortly", self.queue_timeout)
+
+        priority = PRIORITY_EXPENSIVE if expensive else PRIORITY_INTERACTIVE
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._seq), future, expensive]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._remove(entry)
+            if future.done():
+                # Granted right as we timed out; hand the slot back.
+                self.release(expensive)
+            self.rejected += 1
+            raise Overloaded("Server is busy, please retry shortly", self.queue_timeout)
+        except asyncio.CancelledError:
+            self._remove(entry)
+            if future.done():
+                self.release(expensive)
+            raise
+
+    def _remove(self, entry: list):
+        if entry in self._waiters:
+            self._waiters.remove(entry)
+            heapq.heapify(self._waiters)
+
+    def release(self, expensive: bool):
+        self.active -= 1
+        if expensive:
+            self.active_expensive -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        # Walk waiters in priority order and start every one that now fits.
+        blocked = []
+        while self._waiters and self.active < self.max_concurrency:
+            entry = heapq.heappop(self._waiters)
+            _, _, future, expensive = entry
+            if future.done():
+                continue
+            if self._can_run(expensive):
+                self._grant(expensive)
+                future.set_result(None)
+            else:
+                blocked.append(entry)
+        for entry in blocked:
+            heapq.heappush(self._waiters, entry)
+
+    def stats(self) -> Dict:
+        return {
+            "active": self.active,
+            "active_expensive": self.active_expensive,
+            "queued": len(self._waiters),
+            "rejected": self.rejected,
+            "max_concurrency": self.max_concurrency,
+            "max_expensive": self.max_expensive,
+        }
+
+
+admission_controller = AdmissionController()
+scheduler = PriorityScheduler()
+
+
+def _header(scope, name: bytes) -> str:
+    for key, value in scope.get("headers") or []:
+        if key == name:
+            return value.decode("latin-1")
+    return ""
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware that routes every HTTP request through the priority scheduler
+    and answers 429 with Retry-After when the queue is full or times out. Rate-limited
+    routes are charged against the token buckets before they may queue.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        path = scope["path"]
+        expensive = path in EXPENSIVE_PATHS
+        # Conditional requests are charged by the handler, and only when the ETag misses.
+        conditional = path in CONDITIONAL_PATHS and bool(_header(scope, b"if-none-match"))
+        if conditional:
+            expensive = False
+        try:
+            if path in RATE_LIMITED_PATHS and not conditional:
+                scheme, _, token = _header(scope, b"authorization").partition(" ")
+                username = username_from_token(token) if scheme.lower() == "bearer" else None
+                if username is None:
+                    response = JSONResponse(
+                        status_code=401,
+                        content={"detail": "Could not validate credentials"},
+                        headers={"WWW-Authenticate": "Bearer"}
+                    )
+                    await response(scope, receive, send)
+                    return
+                admission_controller.admit(username)
+            await scheduler.acquire(expensive)
+        except Overloaded as e:
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": str(e)},
+                headers=retry_after_header(e.retry_after)
+            )
+            await response(scope, receive, send)
+            return
+        slot = {"expensive": expensive, "held": True}
+        scope.setdefault("state", {})[ADMISSION_SLOT_KEY] = slot
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            if slot["held"]:
+                scheduler.release(slot["expensive"])
+
+
+def charge_admission(username: str):
+    """
+    Take a token from the user's and the global bucket, or raise 429. Used by handlers
+    of CONDITIONAL_PATHS once their ETag check misses (the middleware skipped them).
+    """
+    try:
+        admission_controller.admit(username)
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=retry_after_header(e.retry_after))
+
+
+async def claim_expensive_slot(request: Request):
+    """
+    Trade the request's interactive scheduler slot for an expensive one, waiting behind
+    interactive work like any other analysis request. Raises 429 when none frees up.
+    """
+    slot = request.scope.get("state", {}).get(ADMISSION_SLOT_KEY)
+    if slot is None or slot["expensive"]:
+        return
+    scheduler.release(False)
+    slot["held"] = False
+    try:
+        await scheduler.acquire(True)
+    except Overloaded as e:
+        raise HTTPException(status_code=429, detail=str(e), headers=retry_after_header(e.retry_after))
+    slot["expensive"] = True
+    slot["held"] = True
+
+
+def admission_stats() -> Dict:
+    return {
+        "buckets": admission_controller.stats(),
+        "scheduler": scheduler.stats(),
+    }
@@ -0,0 +1,109 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Sequence
+
+from app.metrics import Histogram
+
+# Histogram bucket upper bounds
+BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+QUEUE_DELAY_MS_BUCKETS = [0.5, 1, 2, 5, 10, 20, 50, 100, 250, 500]
+
+
+class _EncodeRequest:
+    __slots__ = ("texts", "future", "enqueued_at")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future: Future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class EmbeddingBatcher:
+    """
+    Collects encode requests from concurrent callers for up to `window_ms` (or until
+    `max_batch_size` texts are queued), runs a single forward pass on the wrapped
+    embedder and hands each caller back its own rows.
+    """
+
+    def __init__(self, embedder, window_ms: float = 5.0, max_batch_size: int = 64):
+        self.embedder = embedder
+        self.name = f"{embedder.name}+batching"
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max_batch_size
+        self.batch_sizes = Histogram(BATCH_SIZE_BUCKETS)
+        self.queue_delays_ms = Histogram(QUEUE_DELAY_MS_BUCKETS)
+        self._queue: "queue.Queue[_EncodeRequest]" = queue.Queue()
+        self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, texts: Sequence[str]) -> Future:
+        request = _EncodeRequest(list(texts))
+        self._queue.put(request)
+        return request.future
+
+    def encode(self, texts):
+        """
+        Blocking encode with the same contract as the wrapped embedder.
+        """
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        if not items:
+            return self.embedder.encode(items)
+        embeddings = self.submit(items).result()
+        return embeddings[0] if single else embeddings
+
+    def stats(self) -> Dict:
+        return {
+            "window_ms": self.window * 1000.0,
+            "max_batch_size": self.max_batch_size,
+            "queued": self._queue.qsize(),
+            "batch_size": self.batch_sizes.snapshot(),
+            "queue_delay_ms": self.queue_delays_ms.snapshot()
+        }
+
+    def _collect(self) -> List[_EncodeRequest]:
+        batch = [self._queue.get()]
+        size = len(batch[0].texts)
+        deadline = time.perf_counter() + self.window
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            # Drop requests whose callers cancelled their future; it cannot take a result.
+            batch = [request for request in self._collect() if request.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            started = time.perf_counter()
+            texts = [text for request in batch for text in request.texts]
+            for request in batch:
+                self.queue_delays_ms.observe((started - request.enqueued_at) * 1000.0)
+            self.batch_sizes.observe(len(texts))
+
+            try:
+                embeddings = self.embedder.encode(texts)
+            except Exception as e:
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in batch:
+                count = len(request.texts)
+                try:
+                    request.future.set_result(embeddings[offset:offset + count])
+                except Exception as e:
+                    # Never let one caller's future take down the worker every encode() waits on.
+                    print(f"Embedding batcher could not deliver a result: {e}")
+                offset += count
@@ -1,26 +1,221 @@
 import os
+import threading
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring, ReadPreference
 from fastapi import HTTPException
 from contextlib import asynccontextmanager
+from app.metrics import Histogram
 
 MONGODB_URL = os.getenv("MONGODB_URL", "mongodb://localhost:27017")
 
+# Connection pool / wire settings (override via environment variables)
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")  # e.g. "zstd,snappy,zlib"
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv("MONGO_CONNECT_TIMEOUT_MS", "5000"))
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+
+# Per-query server-side time limits
+MONGO_MAX_TIME_MS = int(os.getenv("MONGO_MAX_TIME_MS", "5000"))
+MONGO_ANALYSIS_MAX_TIME_MS = int(os.getenv("MONGO_ANALYSIS_MAX_TIME_MS", "15000"))
+
+# Read preference used by analysis queries (which tolerate slightly stale data)
+READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+MONGO_ANALYSIS_READ_PREFERENCE = READ_PREFERENCES[os.getenv("MONGO_ANALYSIS_READ_PREFERENCE", "secondaryPreferred")]
+
+# Cached PDF extractions expire this long after they were last stored
+PDF_CACHE_TTL_DAYS = int(os.getenv("PDF_CACHE_TTL_DAYS", "30"))
+
+# Stored analysis results (fetched later by clients) expire after this long
+ANALYSIS_RESULT_TTL_HOURS = int(os.getenv("ANALYSIS_RESULT_TTL_HOURS", "24"))
+
+# -------------------------------------------------------------------
+# Pool and query metrics
+
+CHECKOUT_WAIT_MS_BUCKETS = [0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000]
+QUERY_LATENCY_MS_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 5000]
+
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Records how long operations wait to check a connection out of the pool.
+    """
+
+    def __init__(self):
+        self.checkout_wait_ms = Histogram(CHECKOUT_WAIT_MS_BUCKETS)
+        self.checkout_failures = 0
+        self.connections_created = 0
+        self.connections_closed = 0
+        self._local = threading.local()
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        started = getattr(self._local, "started", None)
+        if started is not None:
+            self.checkout_wait_ms.observe((time.perf_counter() - started) * 1000.0)
+            self._local.started = None
+
+    def connection_check_out_failed(self, event):
+        self.checkout_failures += 1
+        self._local.started = None
+
+    def connection_created(self, event):
+        self.connections_created += 1
+
+    def connection_closed(self, event):
+        self.connections_closed += 1
+
+    # Remaining pool events are not needed for metrics.
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_checked_in(self, event):
+        pass
+
+    def snapshot(self):
+        return {
+            "checkout_wait_ms": self.checkout_wait_ms.snapshot(),
+            "checkout_failures": self.checkout_failures,
+            "connections_created": self.connections_created,
+            "connections_closed": self.connections_closed,
+            "connections_open": self.connections_created - self.connections_closed,
+        }
+
+
+class QueryMetricsListener(monitoring.CommandListener):
+    """
+    Records server round-trip latency per command name (find, update, aggregate, ...).
+    """
+
+    def __init__(self):
+        self.latency_ms = {}
+        self.failures = {}
+        self._lock = threading.Lock()
+
+    def _histogram(self, command_name: str) -> Histogram:
+        with self._lock:
+            if command_name not in self.latency_ms:
+                self.latency_ms[command_name] = Histogram(QUERY_LATENCY_MS_BUCKETS)
+            return self.latency_ms[command_name]
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._histogram(event.command_name).observe(event.duration_micros / 1000.0)
+
+    def failed(self, event):
+        self._histogram(event.command_name).observe(event.duration_micros / 1000.0)
+        with self._lock:
+            self.failures[event.command_name] = self.failures.get(event.command_name, 0) + 1
+
+    def snapshot(self):
+        with self._lock:
+            names = list(self.latency_ms)
+            failures = dict(self.failures)
+        return {
+            "latency_ms": {name: self.latency_ms[name].snapshot() for name in names},
+            "failures": failures,
+        }
+
+
+pool_metrics = PoolMetricsListener()
+query_metrics = QueryMetricsListener()
+
+
+def get_db_metrics():
+    return {
+        "pool": pool_metrics.snapshot(),
+        "queries": query_metrics.snapshot(),
+        "config": {
+            "max_pool_size": MONGO_MAX_POOL_SIZE,
+            "min_pool_size": MONGO_MIN_POOL_SIZE,
+            "compressors": MONGO_COMPRESSORS or None,
+            "max_time_ms": MONGO_MAX_TIME_MS,
+            "analysis_max_time_ms": MONGO_ANALYSIS_MAX_TIME_MS,
+        },
+    }
+
+
+def _client_options():
+    options = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "serverSelectionTimeoutMS": MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": MONGO_CONNECT_TIMEOUT_MS,
+        "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        "event_listeners": [pool_metrics, query_metrics],
+    }
+    if MONGO_COMPRESSORS:
+        options["compressors"] = MONGO_COMPRESSORS
+    return options
+
+
 # Create a single client instance
-client = AsyncIOMotorClient(MONGODB_URL)
+client = AsyncIOMotorClient(MONGODB_URL, **_client_options())
+
+_indexes_ready = False
+
+
+async def ensure_indexes():
+    """
+    Create indexes once per process instead of on every request.
+    """
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    # Initialize auth_db indexes if they don't exist
+    await client.auth_db.users.create_index("username", unique=True)
+    await client.auth_db.users.create_index("email", unique=True)
+
+    # Initialize notes_db indexes if they don't exist
+    await client.notes_db.notes.create_index("title")
+    await client.notes_db.notes.create_index("created_at")
+    await client.notes_db.notes.create_index("user_id")
+    await client.notes_db.notes.create_index([("class_id", 1), ("user_id", 1)])
+    # Full-text search is always scoped to one class, so class_id is an equality prefix.
+    await client.notes_db.notes.create_index([("class_id", 1), ("content", "text")], name="class_content_text")
+    await client.notes_db.student_concepts.create_index([("user_id", 1), ("class_id", 1)])
+    await client.notes_db.pdf_text_cache.create_index(
+        "stored_at", expireAfterSeconds=PDF_CACHE_TTL_DAYS * 24 * 3600
+    )
+    await client.notes_db.pdf_text_cache.create_index("last_used_at")
+    await client.notes_db.detailed_analyses.create_index([("class_id", 1), ("user_id", 1)], unique=True)
+    await client.notes_db.analysis_results.create_index(
+        "created_at", expireAfterSeconds=ANALYSIS_RESULT_TTL_HOURS * 3600
+    )
+    _indexes_ready = True
+
 
 @asynccontextmanager
 async def get_database_client():
     try:
-        # Initialize auth_db indexes if they don't exist
-        await client.auth_db.users.create_index("username", unique=True)
-        await client.auth_db.users.create_index("email", unique=True)
-        
-        # Initialize notes_db indexes if they don't exist
-        await client.notes_db.notes.create_index("title")
-        await client.notes_db.notes.create_index("created_at")
-        await client.notes_db.notes.create_index("user_id")
-        
+        await ensure_indexes()
         yield client
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
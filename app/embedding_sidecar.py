@@ -0,0 +1,177 @@
+"""
+Out-of-process embedding sidecar.
+
+One sidecar process owns the embedding model and serves every API worker on the box
+over a Unix socket, so workers never import torch or load the model themselves.
+
+Wire format (all integers big-endian):
+    request:  u32 count, then `count` x (u32 byte length, utf-8 text)
+    response: u8 status, u32 rows, u32 dim, then rows * dim little-endian float32
+              on error status is 1, rows is the message length, dim is 0 and the
+              utf-8 error message follows
+"""
+import asyncio
+import os
+import socket
+import struct
+import threading
+from typing import List
+
+import numpy as np
+
+EMBEDDING_SIDECAR_SOCKET = os.getenv("EMBEDDING_SIDECAR_SOCKET", "")  # empty keeps the in-process model
+DEFAULT_SOCKET_PATH = "/tmp/highnote-embeddings.sock"
+
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+_COUNT = struct.Struct("!I")
+_RESPONSE_HEADER = struct.Struct("!BII")
+_FLOAT32 = np.dtype("<f4")
+
+
+def encode_request(texts: List[str]) -> bytes:
+    parts = [_COUNT.pack(len(texts))]
+    for text in texts:
+        data = text.encode("utf-8")
+        parts.append(_COUNT.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+
+def encode_response(embeddings: np.ndarray) -> bytes:
+    embeddings = np.ascontiguousarray(np.atleast_2d(embeddings), dtype=_FLOAT32)
+    rows, dim = embeddings.shape
+    return _RESPONSE_HEADER.pack(STATUS_OK, rows, dim) + embeddings.tobytes()
+
+
+def encode_error(message: str) -> bytes:
+    data = message.encode("utf-8")
+    return _RESPONSE_HEADER.pack(STATUS_ERROR, len(data), 0) + data
+
+
+# -------------------------------------------------------------------
+# Client used by API workers
+
+class SidecarEmbedder:
+    """
+    Embedder that forwards encode calls to the sidecar. Each calling thread keeps
+    its own persistent connection.
+    """
+
+    name = "sidecar"
+
+    def __init__(self, socket_path: str = EMBEDDING_SIDECAR_SOCKET or DEFAULT_SOCKET_PATH, timeout: float = 30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self) -> socket.socket:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            conn.settimeout(self.timeout)
+            conn.connect(self.socket_path)
+            self._local.conn = conn
+        return conn
+
+    def _reset(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+        self._local.conn = None
+
+    @staticmethod
+    def _recv_exact(conn: socket.socket, size: int) -> bytes:
+        buf = bytearray(size)
+        view = memoryview(buf)
+        received = 0
+        while received < size:
+            n = conn.recv_into(view[received:], size - received)
+            if n == 0:
+                raise ConnectionError("Embedding sidecar closed the connection")
+            received += n
+        return bytes(buf)
+
+    def _request(self, texts: List[str]) -> np.ndarray:
+        conn = self._connection()
+        conn.sendall(encode_request(texts))
+        status, rows, dim = _RESPONSE_HEADER.unpack(self._recv_exact(conn, _RESPONSE_HEADER.size))
+        if status != STATUS_OK:
+            message = self._recv_exact(conn, rows).decode("utf-8")
+            raise RuntimeError(f"Embedding sidecar error: {message}")
+        payload = self._recv_exact(conn, rows * dim * _FLOAT32.itemsize)
+        return np.frombuffer(payload, dtype=_FLOAT32).reshape(rows, dim)
+
+    def encode(self, texts):
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        if not items:
+            return np.zeros((0, 0), dtype=np.float32)
+        try:
+            embeddings = self._request(items)
+        except (ConnectionError, OSError):
+            # The sidecar may have restarted; retry once on a fresh connection.
+            self._reset()
+            embeddings = self._request(items)
+        return embeddings[0] if single else embeddings
+
+
+# -------------------------------------------------------------------
+# Server
+
+async def _read_request(reader: asyncio.StreamReader) -> List[str]:
+    (count,) = _COUNT.unpack(await reader.readexactly(_COUNT.size))
+    texts = []
+    for _ in range(count):
+        (length,) = _COUNT.unpack(await reader.readexactly(_COUNT.size))
+        texts.append((await reader.readexactly(length)).decode("utf-8"))
+    return texts
+
+
+def serve(socket_path: str = DEFAULT_SOCKET_PATH):
+    """
+    Load the configured embedding backend once and serve it on a Unix socket.
+    """
+    from app.embeddings import build_local_embedder
+
+    embedder = build_local_embedder()
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    texts = await _read_request(reader)
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    # Encode in a worker thread so other connections keep flowing (and can be micro-batched).
+                    embeddings = await loop.run_in_executor(None, embedder.encode, texts)
+                    writer.write(encode_response(embeddings))
+                except Exception as e:
+                    print(f"Embedding sidecar error: {e}")
+                    writer.write(encode_error(str(e)))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def main():
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+        server = await asyncio.start_unix_server(handle, path=socket_path)
+        os.chmod(socket_path, 0o660)
+        print(f"Embedding sidecar ({embedder.name}) listening on {socket_path}")
+        async with server:
+            await server.serve_forever()
+
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Shared embedding sidecar for multi-worker deployments")
+    parser.add_argument("--socket", default=EMBEDDING_SIDECAR_SOCKET or DEFAULT_SOCKET_PATH)
+    args = parser.parse_args()
+    serve(args.socket)
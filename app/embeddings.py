@@ -0,0 +1,327 @@
+import os
+import threading
+import time
+from typing import List, Sequence, Union
+
+import numpy as np
+
+# Embedding configuration (override via environment variables)
+EMBEDDING_MODEL_NAME = os.getenv("EMBEDDING_MODEL_NAME", "paraphrase-MiniLM-L6-v2")
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")  # "torch" or "onnx"
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.join("models", "paraphrase-MiniLM-L6-v2-onnx"))
+ONNX_MODEL_FILE = os.getenv("ONNX_MODEL_FILE", "model-int8.onnx")
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 lets onnxruntime decide
+ONNX_MAX_SEQ_LENGTH = 128  # matches the max_seq_length of paraphrase-MiniLM-L6-v2
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "0"))  # 0 disables micro-batching
+EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", "64"))
+
+Texts = Union[str, Sequence[str]]
+
+
+class TorchEmbedder:
+    """
+    Full-precision SentenceTransformer running on PyTorch (the original behaviour).
+    """
+
+    name = "torch"
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts: Texts) -> np.ndarray:
+        return self.model.encode(texts, convert_to_numpy=True)
+
+
+class OnnxEmbedder:
+    """
+    Int8-quantized export of the same model running through onnxruntime on CPU.
+    Produces mean-pooled sentence embeddings, like the SentenceTransformer pipeline.
+    """
+
+    name = "onnx"
+
+    def __init__(
+        self,
+        model_dir: str = ONNX_MODEL_DIR,
+        model_file: str = ONNX_MODEL_FILE,
+        intra_op_threads: int = ONNX_INTRA_OP_THREADS,
+        batch_size: int = 32
+    ):
+        try:
+            import onnxruntime as ort
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise RuntimeError(
+                "The onnx embedding backend requires onnxruntime. Install it with `pip install onnxruntime`."
+            ) from e
+
+        model_path = os.path.join(model_dir, model_file)
+        if not os.path.exists(model_path):
+            raise RuntimeError(
+                f"ONNX model not found at {model_path}. Export it first with `python -m app.embeddings export`."
+            )
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads > 0:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+
+    def _encode_batch(self, batch: List[str]) -> np.ndarray:
+        tokens = self.tokenizer(
+            batch,
+            padding=True,
+            truncation=True,
+            max_length=ONNX_MAX_SEQ_LENGTH,
+            return_tensors="np"
+        )
+        feed = {name: tokens[name].astype(np.int64) for name in self.input_names if name in tokens}
+        token_embeddings = self.session.run(None, feed)[0]
+        # Mean pooling over non-padding tokens
+        mask = tokens["attention_mask"][..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        return (summed / counts).astype(np.float32)
+
+    def encode(self, texts: Texts) -> np.ndarray:
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        if not items:
+            return np.zeros((0, 0), dtype=np.float32)
+        embeddings = np.vstack([
+            self._encode_batch(items[start:start + self.batch_size])
+            for start in range(0, len(items), self.batch_size)
+        ])
+        return embeddings[0] if single else embeddings
+
+
+def load_embedder(backend: str = EMBEDDING_BACKEND):
+    """
+    Build the embedding backend selected by name ("torch" or "onnx").
+    """
+    if backend == "torch":
+        return TorchEmbedder()
+    elif backend == "onnx":
+        return OnnxEmbedder()
+    else:
+        raise ValueError(f"Unsupported embedding backend: {backend}")
+
+
+def build_local_embedder():
+    """
+    Load the model in this process, wrapped in the micro-batcher when enabled.
+    """
+    embedder = load_embedder()
+    if EMBEDDING_BATCH_WINDOW_MS > 0:
+        from app.batching import EmbeddingBatcher
+        embedder = EmbeddingBatcher(embedder, EMBEDDING_BATCH_WINDOW_MS, EMBEDDING_MAX_BATCH_SIZE)
+    return embedder
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """
+    Return the process-wide embedder, loading it on first use (main.py loads it at
+    startup). When EMBEDDING_SIDECAR_SOCKET is set the model lives in the shared sidecar instead.
+    """
+    global _embedder
+    if _embedder is None:
+        # Extractions run in threadpool threads; only one of them may load the model.
+        with _embedder_lock:
+            if _embedder is None:
+                from app.embedding_sidecar import EMBEDDING_SIDECAR_SOCKET, SidecarEmbedder
+                if EMBEDDING_SIDECAR_SOCKET:
+                    embedder = SidecarEmbedder(EMBEDDING_SIDECAR_SOCKET)
+                else:
+                    embedder = build_local_embedder()
+                print(f"Loaded embedding backend: {embedder.name}")
+                _embedder = embedder
+    return _embedder
+
+
+def encode(texts: Texts) -> np.ndarray:
+    """
+    Encode one phrase (1-D result) or a list of phrases (2-D result) with the configured backend.
+    """
+    return get_embedder().encode(texts)
+
+
+def embedding_stats() -> dict:
+    """
+    Report the active backend and, when micro-batching is enabled, its histograms.
+    """
+    embedder = get_embedder()
+    return {
+        "backend": embedder.name,
+        "batching": embedder.stats() if hasattr(embedder, "stats") else None
+    }
+
+
+def cos_sim(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Cosine similarity matrix between two sets of embeddings (numpy equivalent of util.cos_sim).
+    """
+    a = np.atleast_2d(np.asarray(a, dtype=np.float32))
+    b = np.atleast_2d(np.asarray(b, dtype=np.float32))
+    a_norm = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b_norm = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return a_norm @ b_norm.T
+
+
+# -------------------------------------------------------------------
+# Offline tooling: export the quantized model and compare it against PyTorch.
+
+def export_onnx(
+    model_name: str = EMBEDDING_MODEL_NAME,
+    output_dir: str = ONNX_MODEL_DIR,
+    quantize: bool = True
+) -> str:
+    """
+    Export the transformer behind the SentenceTransformer to ONNX and (optionally)
+    apply dynamic int8 quantization. Returns the path of the model to load.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    st_model = SentenceTransformer(model_name, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, token_type_ids):
+            return self.model(
+                input_ids=input_ids,
+                attention_mask=attention_mask,
+                token_type_ids=token_type_ids
+            )[0]
+
+    os.makedirs(output_dir, exist_ok=True)
+    fp32_path = os.path.join(output_dir, "model.onnx")
+    sample = tokenizer(["export sample sentence"], return_tensors="pt")
+    input_names = ["input_ids", "attention_mask", "token_type_ids"]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    with torch.no_grad():
+        torch.onnx.export(
+            _HiddenStates(transformer),
+            tuple(sample[name] for name in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14
+        )
+    tokenizer.save_pretrained(output_dir)
+    print(f"Exported fp32 ONNX model to {fp32_path}")
+
+    if not quantize:
+        return fp32_path
+
+    int8_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    print(f"Wrote int8 quantized ONNX model to {int8_path}")
+    return int8_path
+
+
+def compare_backends(
+    reference,
+    candidate,
+    texts: List[str],
+    repeats: int = 5,
+    min_cosine: float = 0.98
+) -> dict:
+    """
+    Check accuracy drift of a candidate embedder against a reference embedder and
+    compare their throughput on the same texts.
+    """
+    ref_embeddings = reference.encode(texts)
+    cand_embeddings = candidate.encode(texts)
+    per_text = np.diag(cos_sim(ref_embeddings, cand_embeddings))
+
+    # Pairwise similarities drive every threshold decision, so check those drift too.
+    ref_pairwise = cos_sim(ref_embeddings, ref_embeddings)
+    cand_pairwise = cos_sim(cand_embeddings, cand_embeddings)
+
+    def throughput(embedder) -> float:
+        start = time.perf_counter()
+        for _ in range(repeats):
+            embedder.encode(texts)
+        elapsed = time.perf_counter() - start
+        return (len(texts) * repeats) / elapsed if elapsed > 0 else float("inf")
+
+    report = {
+        "num_texts": len(texts),
+        "mean_cosine": float(per_text.mean()),
+        "min_cosine": float(per_text.min()),
+        "max_pairwise_similarity_drift": float(np.abs(ref_pairwise - cand_pairwise).max()),
+        "reference_texts_per_sec": throughput(reference),
+        "candidate_texts_per_sec": throughput(candidate),
+    }
+    report["speedup"] = report["candidate_texts_per_sec"] / report["reference_texts_per_sec"]
+    report["passed"] = report["min_cosine"] >= min_cosine
+    return report
+
+
+SAMPLE_PHRASES = [
+    "photosynthesis converts light energy",
+    "light dependent reactions",
+    "mitochondria produce atp",
+    "cellular respiration",
+    "newton's second law of motion",
+    "force equals mass times acceleration",
+    "supply and demand curves",
+    "market equilibrium price",
+    "binary search tree traversal",
+    "time complexity of sorting algorithms",
+    "the french revolution began in 1789",
+    "causes of the first world war",
+    "derivative of a polynomial function",
+    "integration by parts",
+    "dna replication and transcription",
+    "protein synthesis in ribosomes",
+]
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="ONNX embedding backend tooling")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Export and quantize the embedding model")
+    export_parser.add_argument("--model", default=EMBEDDING_MODEL_NAME)
+    export_parser.add_argument("--output-dir", default=ONNX_MODEL_DIR)
+    export_parser.add_argument("--no-quantize", action="store_true")
+
+    compare_parser = subparsers.add_parser("compare", help="Compare ONNX embeddings against PyTorch")
+    compare_parser.add_argument("--repeats", type=int, default=5)
+    compare_parser.add_argument("--min-cosine", type=float, default=0.98)
+    compare_parser.add_argument("--threads", type=int, default=ONNX_INTRA_OP_THREADS)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        export_onnx(args.model, args.output_dir, quantize=not args.no_quantize)
+    else:
+        result = compare_backends(
+            TorchEmbedder(),
+            OnnxEmbedder(intra_op_threads=args.threads),
+            SAMPLE_PHRASES * 4,
+            repeats=args.repeats,
+            min_cosine=args.min_cosine
+        )
+        print(json.dumps(result, indent=2))
+        raise SystemExit(0 if result["passed"] else 1)
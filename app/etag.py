@@ -0,0 +1,36 @@
+import hashlib
+import json
+from typing import Any, Optional
+
+from fastapi import Response
+
+# Clients may keep responses but must revalidate them with If-None-Match before reuse.
+ETAG_CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts: Any) -> str:
+    """
+    Strong ETag over document versions and request parameters (never over the payload,
+    so it can be checked before the payload is built).
+    """
+    raw = json.dumps(parts, sort_keys=True, default=str).encode("utf-8")
+    return '"' + hashlib.sha1(raw).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 requires for If-None-Match.
+    candidates = (tag.strip() for tag in if_none_match.split(","))
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in candidates)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL})
+
+
+def set_etag(response: Response, etag: str):
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = ETAG_CACHE_CONTROL
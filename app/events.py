@@ -0,0 +1,76 @@
+import asyncio
+from typing import Any, Dict, Optional, Set, Tuple
+
+from fastapi import WebSocket
+from fastapi.encoders import jsonable_encoder
+
+# Give up on a subscriber whose socket does not accept an event within this many seconds
+EVENT_SEND_TIMEOUT_S = 5.0
+
+
+class LobbyEventHub:
+    """
+    In-process registry of WebSocket subscribers per lobby (lobby_id == class_id).
+    Subscribers cost nothing while idle: events are only sent when state changes.
+    Each API worker keeps its own hub, so clients receive events for changes made
+    through the worker they are connected to.
+    """
+
+    def __init__(self):
+        self.channels: Dict[str, Set[Tuple[WebSocket, str]]] = {}
+        # Strong references to in-flight publishes so they are not garbage collected
+        self._tasks: Set[asyncio.Task] = set()
+
+    def subscribe(self, channel: str, websocket: WebSocket, username: str):
+        self.channels.setdefault(channel, set()).add((websocket, username))
+
+    def unsubscribe(self, channel: str, websocket: WebSocket, username: str):
+        subscribers = self.channels.get(channel)
+        if subscribers is None:
+            return
+        subscribers.discard((websocket, username))
+        if not subscribers:
+            del self.channels[channel]
+
+    async def _send(self, channel: str, websocket: WebSocket, username: str, event: Dict[str, Any]):
+        try:
+            await asyncio.wait_for(websocket.send_json(event), EVENT_SEND_TIMEOUT_S)
+        except Exception as e:
+            print(f"Dropping lobby subscriber {username} on {channel}: {e}")
+            self.unsubscribe(channel, websocket, username)
+            # A send cut off by the timeout may have left a partial frame; close the socket
+            # so the client reconnects instead of reading a corrupt stream.
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+
+    async def publish(self, channel: str, event: Dict[str, Any], only_user: Optional[str] = None):
+        """
+        Push an event to every subscriber of `channel` (or only to `only_user`'s sockets).
+        """
+        subscribers = [
+            (websocket, username)
+            for websocket, username in self.channels.get(channel, ())
+            if only_user is None or username == only_user
+        ]
+        if not subscribers:
+            return
+        event = jsonable_encoder({**event, "channel": channel})
+        await asyncio.gather(*(
+            self._send(channel, websocket, username, event) for websocket, username in subscribers
+        ))
+
+    def publish_soon(self, channel: str, event: Dict[str, Any], only_user: Optional[str] = None):
+        """
+        Publish in the background so write endpoints never wait on slow subscribers.
+        """
+        task = asyncio.create_task(self.publish(channel, event, only_user))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def stats(self) -> Dict[str, int]:
+        return {channel: len(subscribers) for channel, subscribers in self.channels.items()}
+
+
+hub = LobbyEventHub()
@@ -0,0 +1,183 @@
+"""
+Streaming bulk export / import of notes and student concepts.
+
+Records are newline-delimited JSON (MongoDB extended JSON, so dates round-trip):
+    {"type": "note", "user_id": ..., "class_id": ..., "content": ..., ...}
+    {"type": "concepts", "user_id": ..., "class_id": ..., "concepts": [...],
+     "embedding_offset": 12, "embedding_count": 5}
+
+The embedding fields only appear when an .npy side file is written. Rows
+[offset, offset + count) of that float32 matrix are the embeddings of `concepts`.
+
+    python -m app.export export --class-id <id> --output class.ndjson --embeddings class.npy
+    python -m app.export export --output all.ndjson
+    python -m app.export import --input class.ndjson
+"""
+import asyncio
+import os
+import shutil
+import tempfile
+from typing import Any, AsyncIterator, Dict, Iterable, Optional
+
+from dotenv import load_dotenv
+from bson import json_util
+from bson.json_util import RELAXED_JSON_OPTIONS
+from fastapi.concurrency import run_in_threadpool
+
+# The CLI runs outside main.py, so load .env before the app modules read their configuration.
+load_dotenv()
+
+from app.repositories import notes_repo, concepts_repo
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+
+def dumps_record(record: Dict[str, Any]) -> str:
+    return json_util.dumps(record, json_options=RELAXED_JSON_OPTIONS) + "\n"
+
+
+class NpyStreamWriter:
+    """
+    Appends float32 rows to a .npy file without holding the matrix in memory. Rows go
+    to a temporary raw file and the header (which needs the final shape) is written on close.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.rows = 0
+        self.dim: Optional[int] = None
+        directory = os.path.dirname(os.path.abspath(path))
+        self._raw = tempfile.NamedTemporaryFile(dir=directory, suffix=".raw", delete=False)
+
+    def append(self, embeddings) -> int:
+        """
+        Append a (n, dim) block and return the row offset it was written at.
+        """
+        import numpy as np
+        block = np.ascontiguousarray(np.atleast_2d(embeddings), dtype="<f4")
+        if self.dim is None:
+            self.dim = block.shape[1]
+        elif block.shape[1] != self.dim:
+            raise ValueError(f"Embedding dimension changed from {self.dim} to {block.shape[1]}")
+        offset = self.rows
+        self._raw.write(block.tobytes())
+        self.rows += block.shape[0]
+        return offset
+
+    def close(self):
+        from numpy.lib import format as npy_format
+        self._raw.close()
+        try:
+            with open(self.path, "wb") as out:
+                npy_format.write_array_header_1_0(out, {
+                    "descr": "<f4",
+                    "fortran_order": False,
+                    "shape": (self.rows, self.dim or 0),
+                })
+                with open(self._raw.name, "rb") as raw:
+                    shutil.copyfileobj(raw, out)
+        finally:
+            os.unlink(self._raw.name)
+
+
+async def iter_export_records(
+    class_id: Optional[str] = None,
+    embeddings: Optional[NpyStreamWriter] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Walk notes, then student concepts, for one class (or all classes) with server-side
+    cursors, yielding one record at a time.
+    """
+    async for doc in notes_repo.iter_all(class_id, EXPORT_BATCH_SIZE):
+        yield {"type": "note", **doc}
+
+    async for doc in concepts_repo.iter_all(class_id, EXPORT_BATCH_SIZE):
+        record = {"type": "concepts", **doc}
+        concepts = doc.get("concepts") or []
+        if embeddings is not None and concepts:
+            from app.embeddings import encode
+            vectors = await run_in_threadpool(encode, concepts)
+            record["embedding_offset"] = embeddings.append(vectors)
+            record["embedding_count"] = len(concepts)
+        yield record
+
+
+async def iter_export_ndjson(class_id: Optional[str] = None) -> AsyncIterator[str]:
+    async for record in iter_export_records(class_id):
+        yield dumps_record(record)
+
+
+async def import_records(lines: Iterable[str], batch_size: int = EXPORT_BATCH_SIZE) -> Dict[str, int]:
+    """
+    Upsert exported records in batches, keyed by (user_id, class_id).
+    Embedding references are dropped; embeddings are derived data.
+    """
+    counts = {"note": 0, "concepts": 0, "skipped": 0}
+    pending = {"note": [], "concepts": []}
+    repos = {"note": notes_repo, "concepts": concepts_repo}
+
+    async def flush(kind: str):
+        if pending[kind]:
+            await repos[kind].bulk_upsert(pending[kind])
+            counts[kind] += len(pending[kind])
+            pending[kind] = []
+
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json_util.loads(line)
+        kind = record.pop("type", None)
+        if kind not in pending or "user_id" not in record or "class_id" not in record:
+            counts["skipped"] += 1
+            continue
+        record.pop("embedding_offset", None)
+        record.pop("embedding_count", None)
+        pending[kind].append(record)
+        if len(pending[kind]) >= batch_size:
+            await flush(kind)
+
+    for kind in pending:
+        await flush(kind)
+    return counts
+
+
+async def export_to_file(output: str, class_id: Optional[str] = None, embeddings_path: Optional[str] = None) -> int:
+    writer = NpyStreamWriter(embeddings_path) if embeddings_path else None
+    count = 0
+    try:
+        with open(output, "w", encoding="utf-8") as f:
+            async for record in iter_export_records(class_id, writer):
+                f.write(dumps_record(record))
+                count += 1
+    finally:
+        if writer is not None:
+            writer.close()
+    return count
+
+
+async def import_from_file(path: str) -> Dict[str, int]:
+    with open(path, "r", encoding="utf-8") as f:
+        return await import_records(f)
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk export / import of notes and concepts")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    export_parser = subparsers.add_parser("export", help="Write NDJSON (and optionally .npy embeddings)")
+    export_parser.add_argument("--class-id", help="export one class (default: all classes)")
+    export_parser.add_argument("--output", required=True)
+    export_parser.add_argument("--embeddings", help="write concept embeddings to this .npy file")
+
+    import_parser = subparsers.add_parser("import", help="Upsert records from an NDJSON export")
+    import_parser.add_argument("--input", required=True)
+
+    args = parser.parse_args()
+    if args.command == "export":
+        written = asyncio.run(export_to_file(args.output, args.class_id, args.embeddings))
+        print(f"Exported {written} records to {args.output}")
+    else:
+        result = asyncio.run(import_from_file(args.input))
+        print(f"Imported {result['note']} notes and {result['concepts']} concept records ({result['skipped']} skipped)")
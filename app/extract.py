@@ -1,18 +1,15 @@
 import re
-from typing import List
+from typing import Any, Dict, List, Optional
 from difflib import SequenceMatcher
 from rake_nltk import Rake
 from nltk.corpus import stopwords
-from sentence_transformers import SentenceTransformer, util
 import nltk
+from app.embeddings import encode, cos_sim
 
 # Download required resources if not already present
 nltk.download('stopwords')
 nltk.download('punkt_tab')  # Downloads additional tokenizer data
 
-# Initialize the sentence transformer model once (reuse across calls)
-model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
-
 
 def calculate_dynamic_threshold(text_length: int, class_size: int = 1) -> float:
     """
@@ -44,10 +41,9 @@ def is_similar(phrase_a: str, phrase_b: str, threshold: float = 0.75, method: st
     if method == 'string':
         return SequenceMatcher(None, normalize_phrase(phrase_a), normalize_phrase(phrase_b)).ratio() >= threshold
     elif method == 'semantic':
-        emb_a = model.encode(phrase_a, convert_to_tensor=True)
-        emb_b = model.encode(phrase_b, convert_to_tensor=True)
-        # Use cosine similarity from sentence-transformers utility
-        return util.pytorch_cos_sim(emb_a, emb_b).item() >= threshold
+        # Encode both phrases in one call with the configured embedding backend
+        emb_a, emb_b = encode([phrase_a, phrase_b])
+        return cos_sim(emb_a, emb_b).item() >= threshold
     else:
         raise ValueError("Unsupported similarity method")
 
@@ -57,6 +53,17 @@ def filter_similar_phrases(phrases: List[str], threshold: float = 0.75, method:
     Filter out phrases that are similar to each other.
     Only one phrase from a similar group is kept.
     """
+    if method == 'semantic' and phrases:
+        # Encode the whole list once and compare rows of one similarity matrix, instead
+        # of one encode call per phrase pair.
+        embeddings = encode(list(phrases))
+        similarities = cos_sim(embeddings, embeddings)
+        kept = []
+        for i in range(len(phrases)):
+            if not any(similarities[i, j] >= threshold for j in kept):
+                kept.append(i)
+        return [phrases[i] for i in kept]
+
     filtered = []
     for phrase in phrases:
         if not any(is_similar(phrase, existing, threshold, method) for existing in filtered):
@@ -64,6 +71,73 @@ def filter_similar_phrases(phrases: List[str], threshold: float = 0.75, method:
     return filtered
 
 
+def align_concepts(
+    student_concepts: List[str],
+    other_concepts: List[str],
+    common_threshold: float = 0.8,
+    missing_threshold: Optional[float] = None,
+    extra_threshold: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Align a student's concepts with the class concepts using one student-by-class
+    similarity matrix, and derive common, missing and extra concepts from it.
+
+    Args:
+        student_concepts: Concepts extracted from the student's notes.
+        other_concepts: Concepts extracted from the other students' notes.
+        common_threshold: A student concept is common if its best class match reaches this score.
+        missing_threshold: A class concept is missing if no student concept reaches this score
+            (defaults to common_threshold).
+        extra_threshold: A student concept is extra if no class concept reaches this score
+            (defaults to common_threshold).
+
+    Returns:
+        A dict with common_concepts, missing_concepts, extra_concepts and match_scores.
+    """
+    missing_threshold = common_threshold if missing_threshold is None else missing_threshold
+    extra_threshold = common_threshold if extra_threshold is None else extra_threshold
+
+    if not student_concepts or not other_concepts:
+        return {
+            "common_concepts": [],
+            "missing_concepts": list(other_concepts),
+            "extra_concepts": list(student_concepts),
+            "match_scores": []
+        }
+
+    # Encode both lists in a single call (one forward pass) and compare them in one matrix op.
+    embeddings = encode(student_concepts + other_concepts)
+    similarity = cos_sim(embeddings[:len(student_concepts)], embeddings[len(student_concepts):])
+    best_for_student = similarity.argmax(axis=1)
+    best_for_class = similarity.max(axis=0)
+
+    common, extra, match_scores = [], [], []
+    for idx, concept in enumerate(student_concepts):
+        match_idx = int(best_for_student[idx])
+        score = float(similarity[idx, match_idx])
+        match_scores.append({"concept": concept, "best_match": other_concepts[match_idx], "score": round(score, 4)})
+        if score >= common_threshold:
+            common.append(concept)
+        if score < extra_threshold:
+            extra.append(concept)
+    missing = [concept for idx, concept in enumerate(other_concepts) if best_for_class[idx] < missing_threshold]
+
+    return {
+        "common_concepts": common,
+        "missing_concepts": missing,
+        "extra_concepts": extra,
+        "match_scores": match_scores
+    }
+
+
+def find_common_concepts(student_concepts: List[str], other_concepts: List[str], sim_threshold: float = 0.8) -> List[str]:
+    """
+    Compare two lists of concept phrases semantically and return a list of common concepts
+    based on a cosine similarity threshold.
+    """
+    return align_concepts(student_concepts, other_concepts, sim_threshold)["common_concepts"]
+
+
 def extract_key_concepts(
     text: str,
     num_concepts: int = 10,
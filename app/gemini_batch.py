@@ -0,0 +1,201 @@
+import json
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional
+
+# Class-level batch analysis configuration (override via environment variables)
+GEMINI_BACKEND = os.getenv("GEMINI_BACKEND", "google")  # "google" or "fake" (local, no API calls)
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "gemini-1.5-flash")
+GEMINI_BATCH_SIZE = int(os.getenv("GEMINI_BATCH_SIZE", "8"))  # students per request
+GEMINI_CLASS_CONTEXT_CHARS = int(os.getenv("GEMINI_CLASS_CONTEXT_CHARS", "6000"))  # split evenly across students
+GEMINI_STUDENT_NOTES_CHARS = 3000  # same condensing as detailed-note-analysis
+
+STUDENT_HEADER = "### STUDENT:"
+
+
+# -------------------------------------------------------------------
+# Backends
+
+class GeminiBackend(ABC):
+    """
+    Interface for text-generation backends used by the batch analysis.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def generate(self, prompt: str) -> str:
+        ...
+
+
+class GoogleGeminiBackend(GeminiBackend):
+    name = "google"
+
+    def __init__(self, model_name: str = GEMINI_MODEL_NAME):
+        import google.generativeai as genai
+        api_key = os.environ.get("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("Gemini API key not configured. Please add GEMINI_API_KEY to your environment variables.")
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel(model_name)
+
+    async def generate(self, prompt: str) -> str:
+        from fastapi.concurrency import run_in_threadpool
+        response = await run_in_threadpool(self.model.generate_content, prompt)
+        return response.text
+
+
+class FakeGeminiBackend(GeminiBackend):
+    """
+    Deterministic local backend: answers a batch prompt with one canned analysis per
+    student found in it. Useful for development and for testing the batch parsing.
+    """
+
+    name = "fake"
+
+    def __init__(self):
+        self.prompts: List[str] = []
+
+    async def generate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        student_ids = re.findall(rf"^\s*{re.escape(STUDENT_HEADER)}\s*(\S+)\s*$", prompt, re.MULTILINE)
+        students = {}
+        for student_id in student_ids:
+            students[student_id] = {
+                "topicCoverage": [],
+                "missingTopics": [],
+                "datasetKnowledge": [],
+                "qualityAssessment": f"Fake analysis for {student_id}",
+                "strengthsAndWeaknesses": {"strengths": [], "weaknesses": []},
+                "studyRecommendations": []
+            }
+        return json.dumps({"students": students})
+
+
+def load_backend(name: str = GEMINI_BACKEND) -> GeminiBackend:
+    if name == "google":
+        return GoogleGeminiBackend()
+    elif name == "fake":
+        return FakeGeminiBackend()
+    else:
+        raise ValueError(f"Unsupported Gemini backend: {name}")
+
+
+# -------------------------------------------------------------------
+# Prompt building and parsing
+
+def build_class_context(students: List[Dict[str, Any]], max_chars: int = GEMINI_CLASS_CONTEXT_CHARS) -> str:
+    """
+    Shared class dataset made of an equal-length excerpt from every student's notes,
+    each labelled with its student id, so the whole class fits in `max_chars`.
+    """
+    if not students:
+        return ""
+    per_student = max(1, max_chars // len(students))
+    return "\n".join(
+        f"[{student['user_id']}] {student['content'][:per_student]}"
+        for student in students
+    )
+
+
+def build_class_prompt(class_context: str, class_concepts: List[str], students: List[Dict[str, Any]]) -> str:
+    """
+    One prompt carrying the shared class context (see build_class_context) once, followed
+    by every student's notes. Each student dict has user_id, content and concepts.
+    """
+    sections = []
+    for student in students:
+        sections.append(
+            f"{STUDENT_HEADER} {student['user_id']}\n"
+            f"NOTES:\n{student['content'][:GEMINI_STUDENT_NOTES_CHARS]}\n"
+            f"EXTRACTED KEY CONCEPTS: {', '.join(student.get('concepts', [])) or 'None'}\n"
+        )
+    student_ids = ", ".join(f'"{student["user_id"]}"' for student in students)
+
+    return f"""
+    As an educational assistant, analyze each student's notes below against the shared class dataset
+    and extract valuable information from the dataset to enhance each student's notes.
+
+    CLASS DATASET (AN EQUAL-LENGTH EXCERPT FROM EVERY STUDENT'S NOTES, EACH LABELLED WITH ITS STUDENT ID):
+    {class_context}
+
+    When analyzing a student, treat only the OTHER students' excerpts as the dataset; ignore the
+    excerpt labelled with that student's own id.
+
+    EXTRACTED KEY CONCEPTS FROM DATASET:
+    {', '.join(class_concepts) or 'None'}
+
+    STUDENTS TO ANALYZE:
+{chr(10).join(sections)}
+    Provide a single JSON response with one entry per student id ({student_ids}):
+    {{
+        "students": {{
+            "<student id>": {{
+                "topicCoverage": [...],
+                "missingTopics": [...],
+                "datasetKnowledge": [...],
+                "qualityAssessment": "...",
+                "strengthsAndWeaknesses": {{
+                    "strengths": [...],
+                    "weaknesses": [...]
+                }},
+                "studyRecommendations": [...]
+            }}
+        }}
+    }}
+    """
+
+
+def parse_batch_response(text: str, user_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """
+    Split a batch response into per-student analyses. Students missing from the
+    response (or an unparseable response) map to None.
+    """
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        match = re.search(r'(\{.*\})', text, re.DOTALL)
+        try:
+            data = json.loads(match.group(1)) if match else {}
+        except json.JSONDecodeError:
+            data = {}
+    students = data.get("students", {}) if isinstance(data, dict) else {}
+    return {user_id: students.get(user_id) for user_id in user_ids}
+
+
+async def analyze_class_batch(
+    class_context: str,
+    class_concepts: List[str],
+    students: List[Dict[str, Any]],
+    backend: GeminiBackend,
+    batch_size: int = GEMINI_BATCH_SIZE
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Analyze many students with one request per `batch_size` students instead of one
+    request per student. Returns a detailed-note-analysis style document per user id.
+    """
+    results = {}
+    for start in range(0, len(students), batch_size):
+        chunk = students[start:start + batch_size]
+        user_ids = [student["user_id"] for student in chunk]
+        prompt = build_class_prompt(class_context, class_concepts, chunk)
+        print(f"Sending batch prompt for {len(chunk)} students ({len(prompt)} chars) to {backend.name}")
+        try:
+            raw = await backend.generate(prompt)
+        except Exception as e:
+            print(f"Gemini batch error: {e}")
+            for user_id in user_ids:
+                results[user_id] = {"status": "error", "message": str(e)}
+            continue
+
+        for user_id, analysis in parse_batch_response(raw, user_ids).items():
+            if analysis is None:
+                results[user_id] = {
+                    "status": "partial_success",
+                    "error": "Student missing from batch response",
+                    "raw_analysis": raw
+                }
+            else:
+                results[user_id] = {"status": "success", "analysis": analysis}
+    return results
@@ -0,0 +1,31 @@
+import bisect
+import threading
+from typing import Dict, List
+
+
+class Histogram:
+    """
+    Minimal fixed-bucket histogram (thread-safe).
+    """
+
+    def __init__(self, buckets: List[float]):
+        self.buckets = list(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is the overflow bucket
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.total += value
+            self.count += 1
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            labels = [f"<={b}" for b in self.buckets] + [f">{self.buckets[-1]}"]
+            return {
+                "buckets": dict(zip(labels, self.counts)),
+                "count": self.count,
+                "mean": self.total / self.count if self.count else 0.0
+            }
@@ -0,0 +1,218 @@
+import hashlib
+import io
+import os
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import Dict, Optional, Type
+
+from fastapi.concurrency import run_in_threadpool
+
+# PDF extraction configuration (override via environment variables)
+PDF_EXTRACTOR = os.getenv("PDF_EXTRACTOR", "pypdf2")  # "pypdf2" or "pymupdf"
+PDF_CACHE_BACKEND = os.getenv("PDF_CACHE_BACKEND", "mongo")  # "mongo", "disk" or "none"
+PDF_CACHE_DIR = os.getenv("PDF_CACHE_DIR", os.path.join(".cache", "pdf_text"))
+PDF_CACHE_MAX_BYTES = int(os.getenv("PDF_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))  # both backends
+
+
+# -------------------------------------------------------------------
+# Extractors
+
+class PdfTextExtractor(ABC):
+    """
+    Interface for PDF text extractors. Subclasses turn raw PDF bytes into text.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    def extract(self, pdf_bytes: bytes) -> str:
+        ...
+
+
+class PyPDF2Extractor(PdfTextExtractor):
+    name = "pypdf2"
+
+    def extract(self, pdf_bytes: bytes) -> str:
+        import PyPDF2
+        reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
+        pages = []
+        for page in reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                pages.append(page_text)
+        return "\n".join(pages)
+
+
+class PyMuPDFExtractor(PdfTextExtractor):
+    """
+    Faster extractor based on PyMuPDF (`pip install pymupdf`).
+    """
+
+    name = "pymupdf"
+
+    def extract(self, pdf_bytes: bytes) -> str:
+        try:
+            import fitz
+        except ImportError as e:
+            raise RuntimeError("The pymupdf extractor requires PyMuPDF. Install it with `pip install pymupdf`.") from e
+        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
+            return "\n".join(page.get_text() for page in doc)
+
+
+EXTRACTORS: Dict[str, Type[PdfTextExtractor]] = {
+    PyPDF2Extractor.name: PyPDF2Extractor,
+    PyMuPDFExtractor.name: PyMuPDFExtractor,
+}
+
+
+def register_extractor(extractor_cls: Type[PdfTextExtractor]):
+    """
+    Make an additional extractor selectable through PDF_EXTRACTOR.
+    """
+    EXTRACTORS[extractor_cls.name] = extractor_cls
+    return extractor_cls
+
+
+# -------------------------------------------------------------------
+# Caches keyed by a hash of the PDF bytes
+
+class DiskTextCache:
+    """
+    Local directory cache with least-recently-used eviction once `max_bytes` is exceeded.
+    """
+
+    def __init__(self, directory: str = PDF_CACHE_DIR, max_bytes: int = PDF_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes: Optional[int] = None
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.txt")
+
+    def _get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                text = f.read()
+        except FileNotFoundError:
+            return None
+        os.utime(path)  # mark as recently used
+        return text
+
+    def _put(self, key: str, text: str):
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        data = text.encode("utf-8")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(data)
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _scan_size(self) -> int:
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith(".txt"))
+
+    def _evict(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".txt")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            size = entry.stat().st_size
+            try:
+                os.remove(entry.path)
+                total -= size
+            except FileNotFoundError:
+                pass
+        self._total_bytes = total
+
+    async def get(self, key: str) -> Optional[str]:
+        return await run_in_threadpool(self._get, key)
+
+    async def put(self, key: str, text: str):
+        await run_in_threadpool(self._put, key, text)
+
+
+class MongoTextCache:
+    """
+    Cache stored in notes_db.pdf_text_cache so every API worker shares it. Entries expire
+    after PDF_CACHE_TTL_DAYS, and least-recently-used entries are evicted once the
+    collection holds more than `max_bytes` of text.
+    """
+
+    def __init__(self, max_bytes: int = PDF_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+
+    async def get(self, key: str) -> Optional[str]:
+        from app.repositories import pdf_text_cache_repo
+        return await pdf_text_cache_repo.get_text(key)
+
+    async def put(self, key: str, text: str):
+        from app.repositories import pdf_text_cache_repo
+        await pdf_text_cache_repo.put_text(key, text)
+        evicted = await pdf_text_cache_repo.evict_to(self.max_bytes)
+        if evicted:
+            print(f"Evicted {evicted} PDF text cache entries")
+
+
+def load_cache(backend: str = PDF_CACHE_BACKEND):
+    if backend == "mongo":
+        return MongoTextCache()
+    elif backend == "disk":
+        return DiskTextCache()
+    elif backend == "none":
+        return None
+    else:
+        raise ValueError(f"Unsupported PDF cache backend: {backend}")
+
+
+extractor: PdfTextExtractor = EXTRACTORS[PDF_EXTRACTOR]()
+cache = load_cache()
+
+
+def clean_text(text: str) -> str:
+    # Replace runs of whitespace with a single space.
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def cache_key(pdf_bytes: bytes, extractor_name: str) -> str:
+    # Different extractors produce different text, so the extractor is part of the key.
+    return f"{hashlib.sha256(pdf_bytes).hexdigest()}-{extractor_name}"
+
+
+async def extract_pdf_text(pdf_bytes: bytes) -> str:
+    """
+    Return the cleaned text of a PDF, skipping parsing entirely when the same file
+    has already been extracted (e.g. slides uploaded by several students).
+    """
+    key = cache_key(pdf_bytes, extractor.name)
+    if cache is not None:
+        try:
+            cached = await cache.get(key)
+        except Exception as e:
+            print(f"PDF text cache lookup failed: {e}")
+            cached = None
+        if cached is not None:
+            print(f"PDF text cache hit for {key[:12]}")
+            return cached
+
+    text = clean_text(await run_in_threadpool(extractor.extract, pdf_bytes))
+    print(f"Extracted {len(text)} characters from PDF with {extractor.name}")
+
+    if cache is not None:
+        try:
+            await cache.put(key, text)
+        except Exception as e:
+            print(f"PDF text cache store failed: {e}")
+    return text
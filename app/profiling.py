@@ -0,0 +1,202 @@
+import asyncio
+import cProfile
+import io
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+
+# On-demand profiling configuration. With no PROFILE_TOKEN the middleware is not installed.
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_HEADER = b"x-profile"
+PROFILE_MODE_HEADER = b"x-profile-mode"
+PROFILE_QUERY_PARAM = "__profile"
+PROFILE_MAX_REPORTS = int(os.getenv("PROFILE_MAX_REPORTS", "20"))
+PROFILE_SAMPLE_INTERVAL_S = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "5")) / 1000.0
+PROFILE_TOP_ENTRIES = 40
+# Report downloads are never profiled, so inspecting reports does not evict them.
+PROFILE_EXCLUDED_PREFIX = "/admin"
+
+
+class StackSampler:
+    """
+    Samples the stacks of every thread at a fixed interval. Unlike cProfile it also
+    sees work running in threadpool threads (concept extraction, embeddings, Gemini).
+    Other concurrent requests are sampled too.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL_S):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profile-sampler", daemon=True)
+
+    @staticmethod
+    def _collapse(frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.is_set():
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self.counts[self._collapse(frame)] += 1
+            self.samples += 1
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def collapsed(self) -> str:
+        # Brendan Gregg's collapsed-stack format, loadable by flamegraph tools and speedscope.
+        return "\n".join(f"{stack} {count}" for stack, count in self.counts.most_common())
+
+    def summary(self) -> str:
+        lines = [f"{self.samples} samples every {self.interval * 1000:.1f} ms"]
+        for stack, count in self.counts.most_common(PROFILE_TOP_ENTRIES):
+            leaf = stack.rsplit(";", 1)[-1]
+            lines.append(f"{count:6d}  {leaf}")
+        return "\n".join(lines)
+
+
+class ProfileStore:
+    """
+    Keeps the most recent profile reports in memory for download via /admin/profiles.
+    """
+
+    def __init__(self, max_reports: int = PROFILE_MAX_REPORTS):
+        self.max_reports = max_reports
+        self.reports: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def add(self, report: Dict[str, Any]):
+        self.reports[report["profile_id"]] = report
+        while len(self.reports) > self.max_reports:
+            self.reports.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        return self.reports.get(profile_id)
+
+    def list(self):
+        return [
+            {key: value for key, value in report.items() if key not in ("summary", "raw")}
+            for report in reversed(self.reports.values())
+        ]
+
+
+profile_store = ProfileStore()
+
+
+def _requested_profile(scope) -> Optional[str]:
+    """
+    Return the requested mode when the request carries a valid profiling token.
+    """
+    if scope.get("path", "").startswith(PROFILE_EXCLUDED_PREFIX):
+        return None
+    headers = dict(scope.get("headers") or [])
+    token = headers.get(PROFILE_HEADER, b"").decode("latin-1")
+    if not token and scope.get("query_string"):
+        token = parse_qs(scope["query_string"].decode("latin-1")).get(PROFILE_QUERY_PARAM, [""])[0]
+    if not token or token != PROFILE_TOKEN:
+        return None
+    mode = headers.get(PROFILE_MODE_HEADER, b"sample").decode("latin-1")
+    return mode if mode in ("sample", "cprofile") else "sample"
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that profiles a single request when it carries the X-Profile token
+    header (or ?__profile=<token>). It records a cProfile or sampling profile plus the
+    tracemalloc peak. Only one request is profiled at a time.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._lock = asyncio.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode = _requested_profile(scope)
+        if mode is None or self._lock.locked():
+            await self.app(scope, receive, send)
+            return
+        async with self._lock:
+            await self._profile(mode, scope, receive, send)
+
+    async def _profile(self, mode: str, scope, receive, send):
+        profile_id = uuid.uuid4().hex
+        status = {"code": None}
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                message = {**message, "headers": list(message.get("headers", [])) + [(b"x-profile-id", profile_id.encode())]}
+            await send(message)
+
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+
+        profiler = cProfile.Profile() if mode == "cprofile" else None
+        sampler = StackSampler() if mode == "sample" else None
+        start = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        else:
+            sampler.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            if profiler:
+                profiler.disable()
+            else:
+                sampler.stop()
+            duration = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+
+            if profiler:
+                stream = io.StringIO()
+                stats = pstats.Stats(profiler, stream=stream)
+                stats.sort_stats("cumulative").print_stats(PROFILE_TOP_ENTRIES)
+                summary = stream.getvalue()
+                # Same format as cProfile's dump_stats, loadable with pstats / snakeviz.
+                raw = marshal.dumps(stats.stats)
+            else:
+                summary = sampler.summary()
+                raw = sampler.collapsed().encode("utf-8")
+
+            profile_store.add({
+                "profile_id": profile_id,
+                "mode": mode,
+                "method": scope.get("method"),
+                "path": scope.get("path"),
+                "query": scope.get("query_string", b"").decode("latin-1").replace(PROFILE_TOKEN, "***"),
+                "status_code": status["code"],
+                "duration_ms": duration * 1000.0,
+                "tracemalloc_peak_bytes": peak,
+                "created_at": time.time(),
+                "summary": summary,
+                "raw": raw,
+            })
+            print(f"Profiled {scope.get('method')} {scope.get('path')} as {profile_id} ({mode}, {duration * 1000:.1f} ms)")
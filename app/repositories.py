@@ -0,0 +1,364 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+from bson.objectid import ObjectId
+from pymongo import UpdateOne
+from motor.motor_asyncio import AsyncIOMotorClient
+from app.db import (
+    client,
+    MONGO_MAX_TIME_MS,
+    MONGO_ANALYSIS_MAX_TIME_MS,
+    MONGO_ANALYSIS_READ_PREFERENCE,
+)
+
+# Projections: only pull the fields callers actually use over the wire.
+NOTE_CONTENT_PROJECTION = {"_id": 0, "user_id": 1, "class_id": 1, "content": 1}
+CONCEPTS_PROJECTION = {"_id": 0, "concepts": 1}
+
+
+class NotesRepository:
+    """
+    Data access for notes_db.notes. Analysis reads may be served by secondaries.
+    """
+
+    def __init__(self, db_client: AsyncIOMotorClient = client):
+        db = db_client.notes_db
+        self.collection = db.notes
+        self.analysis_collection = db.get_collection("notes", read_preference=MONGO_ANALYSIS_READ_PREFERENCE)
+
+    def _reader(self, analysis: bool):
+        return self.analysis_collection if analysis else self.collection
+
+    async def upsert_note(self, user_id: str, class_id: str, content: str):
+        # `version` is bumped on every write so readers can derive ETags without reading content.
+        return await self.collection.update_one(
+            {"user_id": user_id, "class_id": class_id},
+            {
+                "$set": {"user_id": user_id, "content": content, "class_id": class_id, "updated_at": datetime.utcnow()},
+                "$inc": {"version": 1}
+            },
+            upsert=True
+        )
+
+    async def find_for_student(self, user_id: str, class_id: str, analysis: bool = False) -> List[Dict[str, Any]]:
+        cursor = self._reader(analysis).find(
+            {"user_id": user_id, "class_id": class_id},
+            NOTE_CONTENT_PROJECTION
+        ).max_time_ms(MONGO_ANALYSIS_MAX_TIME_MS if analysis else MONGO_MAX_TIME_MS)
+        return await cursor.to_list(length=None)
+
+    async def find_for_class(self, class_id: str, analysis: bool = True) -> List[Dict[str, Any]]:
+        cursor = self._reader(analysis).find(
+            {"class_id": class_id},
+            NOTE_CONTENT_PROJECTION
+        ).max_time_ms(MONGO_ANALYSIS_MAX_TIME_MS if analysis else MONGO_MAX_TIME_MS)
+        return await cursor.to_list(length=None)
+
+    async def find_for_class_excluding(self, class_id: str, user_id: str, analysis: bool = True) -> List[Dict[str, Any]]:
+        cursor = self._reader(analysis).find(
+            {"class_id": class_id, "user_id": {"$ne": user_id}},
+            NOTE_CONTENT_PROJECTION
+        ).max_time_ms(MONGO_ANALYSIS_MAX_TIME_MS if analysis else MONGO_MAX_TIME_MS)
+        return await cursor.to_list(length=None)
+
+    async def versions_for_class(self, class_id: str, analysis: bool = True) -> List[Tuple[str, int]]:
+        """
+        (user_id, version) for every note in a class, sorted, read from the same members
+        as the analysis itself so the derived ETag describes the data that was analyzed.
+        """
+        cursor = self._reader(analysis).find(
+            {"class_id": class_id},
+            {"_id": 0, "user_id": 1, "version": 1}
+        ).max_time_ms(MONGO_ANALYSIS_MAX_TIME_MS if analysis else MONGO_MAX_TIME_MS)
+        return sorted((doc["user_id"], doc.get("version", 0)) async for doc in cursor)
+
+    def iter_all(self, class_id: Optional[str] = None, batch_size: int = 500):
+        """
+        Server-side cursor over notes (one class or all), for constant-memory exports.
+        """
+        query = {"class_id": class_id} if class_id else {}
+        return self.collection.find(query, {"_id": 0}).sort([("class_id", 1), ("user_id", 1)]).batch_size(batch_size)
+
+    async def bulk_upsert(self, docs: List[Dict[str, Any]]):
+        if not docs:
+            return None
+        # Imported notes get a fresh version so cached ETags for the class are invalidated.
+        return await self.collection.bulk_write([
+            UpdateOne(
+                {"user_id": doc["user_id"], "class_id": doc["class_id"]},
+                {"$set": {k: v for k, v in doc.items() if k != "version"}, "$inc": {"version": 1}},
+                upsert=True
+            )
+            for doc in docs
+        ], ordered=False)
+
+    async def search(
+        self,
+        class_id: str,
+        query: str,
+        limit: int,
+        after: Optional[Tuple[float, ObjectId]] = None,
+        snippet_term: str = "",
+        snippet_chars: int = 240
+    ) -> List[Dict[str, Any]]:
+        """
+        Ranked text search over one class's notes using the class_content_text index.
+        Pages by (score, _id) so deep pages do not re-scan skipped results.
+        Snippets are cut server-side so full note bodies never cross the wire.
+        """
+        pipeline: List[Dict[str, Any]] = [
+            {"$match": {"class_id": class_id, "$text": {"$search": query}}},
+            {"$addFields": {"score": {"$meta": "textScore"}}},
+        ]
+        if after is not None:
+            score, last_id = after
+            pipeline.append({"$match": {"$or": [
+                {"score": {"$lt": score}},
+                {"score": score, "_id": {"$gt": last_id}}
+            ]}})
+        pipeline += [
+            {"$sort": {"score": -1, "_id": 1}},
+            {"$limit": limit},
+            {"$addFields": {"snippet_start": {"$max": [
+                0,
+                {"$subtract": [{"$indexOfCP": [{"$toLower": "$content"}, snippet_term]}, snippet_chars // 3]}
+            ]}}},
+            {"$project": {
+                "user_id": 1,
+                "class_id": 1,
+                "score": 1,
+                "snippet_start": 1,
+                "content_length": {"$strLenCP": "$content"},
+                "snippet": {"$substrCP": ["$content", "$snippet_start", snippet_chars]}
+            }},
+        ]
+        cursor = self._reader(False).aggregate(pipeline, maxTimeMS=MONGO_MAX_TIME_MS)
+        return await cursor.to_list(length=None)
+
+
+class ConceptsRepository:
+    """
+    Data access for notes_db.student_concepts.
+    """
+
+    def __init__(self, db_client: AsyncIOMotorClient = client):
+        self.collection = db_client.notes_db.student_concepts
+
+    async def get_concepts(self, user_id: str, class_id: str) -> List[str]:
+        doc = await self.collection.find_one(
+            {"user_id": user_id, "class_id": class_id},
+            CONCEPTS_PROJECTION,
+            max_time_ms=MONGO_MAX_TIME_MS
+        )
+        return doc.get("concepts", []) if doc else []
+
+    async def get_concepts_for_class(self, class_id: str) -> Dict[str, List[str]]:
+        cursor = self.collection.find(
+            {"class_id": class_id},
+            {"_id": 0, "user_id": 1, "concepts": 1}
+        ).max_time_ms(MONGO_MAX_TIME_MS)
+        return {doc["user_id"]: doc.get("concepts", []) async for doc in cursor}
+
+    def iter_all(self, class_id: Optional[str] = None, batch_size: int = 500):
+        query = {"class_id": class_id} if class_id else {}
+        return self.collection.find(query, {"_id": 0}).sort([("class_id", 1), ("user_id", 1)]).batch_size(batch_size)
+
+    async def bulk_upsert(self, docs: List[Dict[str, Any]]):
+        if not docs:
+            return None
+        return await self.collection.bulk_write([
+            UpdateOne({"user_id": doc["user_id"], "class_id": doc["class_id"]}, {"$set": doc}, upsert=True)
+            for doc in docs
+        ], ordered=False)
+
+    async def set_concepts(self, user_id: str, class_id: str, concepts: List[str]):
+        return await self.collection.update_one(
+            {"user_id": user_id, "class_id": class_id},
+            {"$set": {"concepts": concepts}},
+            upsert=True
+        )
+
+
+class LobbiesRepository:
+    """
+    Data access for notes_db.lobbies.
+    """
+
+    def __init__(self, db_client: AsyncIOMotorClient = client):
+        self.collection = db_client.notes_db.lobbies
+
+    async def insert(self, lobby_data: Dict[str, Any]):
+        return await self.collection.insert_one({**lobby_data, "version": 1, "updated_at": datetime.utcnow()})
+
+    async def get(self, lobby_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": ObjectId(lobby_id)}, max_time_ms=MONGO_MAX_TIME_MS)
+
+    async def list_versions(self) -> List[Tuple[str, int]]:
+        cursor = self.collection.find({}, {"_id": 1, "version": 1}).max_time_ms(MONGO_MAX_TIME_MS)
+        return sorted((str(doc["_id"]), doc.get("version", 0)) async for doc in cursor)
+
+    async def list_all(self) -> List[Dict[str, Any]]:
+        # Passwords never leave the lobby listing.
+        cursor = self.collection.find({}, {"password": 0}).max_time_ms(MONGO_MAX_TIME_MS)
+        return await cursor.to_list(length=None)
+
+    async def delete(self, lobby_id: str):
+        return await self.collection.delete_one({"_id": ObjectId(lobby_id)})
+
+    async def increment_user_count(self, lobby_id: str):
+        return await self.collection.update_one(
+            {"_id": ObjectId(lobby_id)},
+            {"$inc": {"user_count": 1, "version": 1}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+
+    async def update_settings(self, lobby_id: str, advanced_settings: Optional[Dict[str, Any]]):
+        return await self.collection.update_one(
+            {"_id": ObjectId(lobby_id)},
+            {
+                "$set": {"advanced_settings": advanced_settings, "updated_at": datetime.utcnow()},
+                "$inc": {"version": 1}
+            }
+        )
+
+
+class UsersRepository:
+    """
+    Data access for auth_db.users.
+    """
+
+    def __init__(self, db_client: AsyncIOMotorClient = client):
+        self.collection = db_client.auth_db.users
+
+    async def get_by_username(self, username: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"username": username}, max_time_ms=MONGO_MAX_TIME_MS)
+
+    async def find_by_username_or_email(self, username: str, email: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one(
+            {"$or": [{"username": username}, {"email": email}]},
+            {"_id": 1},
+            max_time_ms=MONGO_MAX_TIME_MS
+        )
+
+    async def insert(self, user_dict: Dict[str, Any]):
+        return await self.collection.insert_one(user_dict)
+
+
+class PdfTextCacheRepository:
+    """
+    Data access for notes_db.pdf_text_cache (extracted PDF text keyed by content hash).
+    """
+
+    def __init__(self, db_client: AsyncIOMotorClient = client):
+        self.collection = db_client.notes_db.pdf_text_cache
+
+    async def get_text(self, key: str) -> Optional[str]:
+        # Touch last_used_at on every hit so size eviction drops the least recently used text.
+        doc = await self.collection.find_one_and_update(
+            {"_id": key},
+            {"$set": {"last_used_at": datetime.utcnow()}},
+            projection={"_id": 0, "text": 1},
+            maxTimeMS=MONGO_MAX_TIME_MS
+        )
+        return doc["text"] if doc else None
+
+    async def put_text(self, key: str, text: str):
+        now = datetime.utcnow()
+        return await self.collection.update_one(
+            {"_id": key},
+            {"$set": {"text": text, "size": len(text.encode("utf-8")), "stored_at": now, "last_used_at": now}},
+            upsert=True
+        )
+
+    async def evict_to(self, max_bytes: int) -> int:
+        """
+        Delete least-recently-used entries until the stored text totals at most `max_bytes`.
+        Returns the number of entries removed.
+        """
+        totals = await self.collection.aggregate([
+            {"$group": {"_id": None, "total": {"$sum": "$size"}}}
+        ]).to_list(length=1)
+        total = totals[0]["total"] if totals else 0
+        if total <= max_bytes:
+            return 0
+        evicted = []
+        async for doc in self.collection.find({}, {"_id": 1, "size": 1}).sort("last_used_at", 1):
+            if total <= max_bytes:
+                break
+            evicted.append(doc["_id"])
+            total -= doc.get("size", 0)
+        await self.collection.delete_many({"_id": {"$in": evicted}})
+        return len(evicted)
+
+
+class AnalysisResultsRepository:
+    """
+    Data access for notes_db.analysis_results (analyses whose Gemini enrichment finishes
+    after the response was sent).
+    """
+
+    def __init__(self, db_client: AsyncIOMotorClient = client):
+        self.collection = db_client.notes_db.analysis_results
+
+    async def create_pending(self, analysis_id: str, user_id: str, class_id: str, result: Dict[str, Any]):
+        return await self.collection.insert_one({
+            "_id": analysis_id,
+            "user_id": user_id,
+            "class_id": class_id,
+            "status": "pending",
+            "result": result,
+            "created_at": datetime.utcnow()
+        })
+
+    async def complete(self, analysis_id: str, result: Dict[str, Any], status: str = "complete"):
+        return await self.collection.update_one(
+            {"_id": analysis_id},
+            {"$set": {"status": status, "result": result, "completed_at": datetime.utcnow()}}
+        )
+
+    async def get(self, analysis_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"_id": analysis_id}, max_time_ms=MONGO_MAX_TIME_MS)
+
+
+class DetailedAnalysesRepository:
+    """
+    Data access for notes_db.detailed_analyses (per-student results of class batch analysis).
+    """
+
+    def __init__(self, db_client: AsyncIOMotorClient = client):
+        self.collection = db_client.notes_db.detailed_analyses
+
+    async def save_many(self, class_id: str, results: Dict[str, Dict[str, Any]]):
+        """
+        Store one result per student. Failed results (anything but status "success")
+        never overwrite an earlier successful analysis.
+        """
+        if not results:
+            return None
+        now = datetime.utcnow()
+        operations = []
+        for user_id, result in results.items():
+            key = {"user_id": user_id, "class_id": class_id}
+            document = {**result, "user_id": user_id, "class_id": class_id, "updated_at": now}
+            if result.get("status") == "success":
+                operations.append(UpdateOne(key, {"$set": document}, upsert=True))
+            else:
+                # Replace an earlier failure, or insert when the student has no result yet.
+                operations.append(UpdateOne({**key, "status": {"$ne": "success"}}, {"$set": document}))
+                operations.append(UpdateOne(key, {"$setOnInsert": document}, upsert=True))
+        return await self.collection.bulk_write(operations, ordered=False)
+
+    async def get(self, user_id: str, class_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one(
+            {"user_id": user_id, "class_id": class_id},
+            {"_id": 0},
+            max_time_ms=MONGO_MAX_TIME_MS
+        )
+
+
+# Shared repository instances bound to the process-wide client
+notes_repo = NotesRepository()
+concepts_repo = ConceptsRepository()
+lobbies_repo = LobbiesRepository()
+users_repo = UsersRepository()
+pdf_text_cache_repo = PdfTextCacheRepository()
+analysis_results_repo = AnalysisResultsRepository()
+detailed_analyses_repo = DetailedAnalysesRepository()
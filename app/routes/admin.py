@@ -0,0 +1,42 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from app.profiling import PROFILE_TOKEN, profile_store
+
+router = APIRouter()
+
+
+async def require_profile_token(x_profile: str = Header("")):
+    if not PROFILE_TOKEN or x_profile != PROFILE_TOKEN:
+        raise HTTPException(status_code=403, detail="Profiling is disabled or the X-Profile token is invalid")
+
+
+# -------------------------------------------------------------------
+# /profiles endpoint: List stored per-request profiles (newest first).
+@router.get("/profiles", dependencies=[Depends(require_profile_token)])
+async def list_profiles():
+    return profile_store.list()
+
+# -------------------------------------------------------------------
+# /profiles/{profile_id} endpoint: Text summary and metadata for one profile.
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_profile_token)])
+async def get_profile(profile_id: str):
+    report = profile_store.get(profile_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return {key: value for key, value in report.items() if key != "raw"}
+
+# -------------------------------------------------------------------
+# /profiles/{profile_id}/download endpoint: Raw profile (.prof for cProfile, collapsed stacks for sampling).
+@router.get("/profiles/{profile_id}/download", dependencies=[Depends(require_profile_token)])
+async def download_profile(profile_id: str):
+    report = profile_store.get(profile_id)
+    if not report:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if report["mode"] == "cprofile":
+        filename, media_type = f"{profile_id}.prof", "application/octet-stream"
+    else:
+        filename, media_type = f"{profile_id}.collapsed.txt", "text/plain"
+    return Response(
+        content=report["raw"],
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
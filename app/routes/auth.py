@@ -6,6 +6,7 @@ from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.db import get_database_client
+from app.repositories import users_repo
 from motor.motor_asyncio import AsyncIOMotorClient
 
 router = APIRouter()
@@ -46,8 +47,8 @@ def get_password_hash(password):
     return pwd_context.hash(password)
 
 async def get_user(db: AsyncIOMotorClient, username: str):
-    async with get_database_client() as client:
-        user_dict = await client.auth_db.users.find_one({"username": username})
+    async with get_database_client():
+        user_dict = await users_repo.get_by_username(username)
         if user_dict:
             return UserInDB(**user_dict)
 
@@ -69,20 +70,26 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
+def username_from_token(token: str) -> Optional[str]:
+    """
+    Return the username of a valid access token, or None. Does not touch the database.
+    """
+    try:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        return None
+    return payload.get("sub")
+
 async def get_current_user(token: str = Depends(oauth2_scheme)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-        token_data = TokenData(username=username)
-    except JWTError:
+    username = username_from_token(token)
+    if username is None:
         raise credentials_exception
+    token_data = TokenData(username=username)
     user = await get_user(None, token_data.username)
     if user is None:
         raise credentials_exception
@@ -90,14 +97,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 
 @router.post("/signup", response_model=User)
 async def signup(request: SignupRequest):
-    async with get_database_client() as client:
+    async with get_database_client():
         # Check if user already exists
-        existing_user = await client.auth_db.users.find_one({
-            "$or": [
-                {"username": request.user.username},
-                {"email": request.user.email}
-            ]
-        })
+        existing_user = await users_repo.find_by_username_or_email(request.user.username, request.user.email)
         if existing_user:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -110,7 +112,7 @@ async def signup(request: SignupRequest):
         user_dict["hashed_password"] = hashed_password
         user_dict["disabled"] = False
         
-        result = await client.auth_db.users.insert_one(user_dict)
+        result = await users_repo.insert(user_dict)
         if not result.inserted_id:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -0,0 +1,28 @@
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+from app.events import hub
+from app.routes.auth import get_current_user
+
+router = APIRouter()
+
+# -------------------------------------------------------------------
+# /lobbies/{lobby_id} websocket: Push lobby changes and analysis results instead of polling.
+# Browsers cannot set an Authorization header on websockets, so the JWT comes as ?token=...
+@router.websocket("/lobbies/{lobby_id}")
+async def lobby_events(websocket: WebSocket, lobby_id: str, token: str):
+    try:
+        user = await get_current_user(token)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    hub.subscribe(lobby_id, websocket, user.username)
+    try:
+        await websocket.send_json({"type": "subscribed", "channel": lobby_id})
+        # Nothing to do until the client disconnects; events are pushed by the hub.
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        hub.unsubscribe(lobby_id, websocket, user.username)
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, Body  # <- Added Body
+from fastapi import APIRouter, Depends, HTTPException, Body, Header, Response  # <- Added Body
 from motor.motor_asyncio import AsyncIOMotorClient
 from pydantic import BaseModel
 from datetime import datetime
 from typing import Optional, Dict, Any
 from app.db import get_database_client
+from app.repositories import lobbies_repo
+from app.events import hub
+from app.etag import make_etag, etag_matches, not_modified, set_etag
 
-from bson.objectid import ObjectId
 from app.routes.auth import get_current_user
 from app.routes.auth import User
 
@@ -35,8 +37,7 @@ async def create_lobby(
                 detail=f"Description is too long ({word_count} words). Limit is 50 words."
             )
 
-    async with get_database_client() as client:
-        db = client.notes_db
+    async with get_database_client():
         lobby_data = {
             "lobby_name": payload.lobby_name,
             "created_by": current_user.username,
@@ -51,7 +52,7 @@ async def create_lobby(
                 "similarityThresholdAnalyze": 0.8,
             }
         }
-        result = await db.lobbies.insert_one(lobby_data)
+        result = await lobbies_repo.insert(lobby_data)
         if not result.inserted_id:
             raise HTTPException(status_code=500, detail="Failed to create lobby")
 
@@ -61,17 +62,24 @@ async def create_lobby(
 @router.get("/lobbies/{lobby_id}")
 async def get_lobby_by_id(
     lobby_id: str,
+    http_response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db_client: AsyncIOMotorClient = Depends(get_database_client)
 ):
-    async with get_database_client() as client:
-        db = client.notes_db
-        lobby = await db.lobbies.find_one({"_id": ObjectId(lobby_id)})
+    async with get_database_client():
+        lobby = await lobbies_repo.get(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Lobby not found")
             
         # Check if the current user is the creator
         is_creator = lobby.get("created_by") == current_user.username
+
+        # The creator's view includes the password, so it gets its own ETag.
+        etag = make_etag("lobby", lobby_id, lobby.get("version", 0), is_creator)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        set_etag(http_response, etag)
         
         # Build response object
         response = {
@@ -102,9 +110,8 @@ async def delete_lobby(
     current_user: User = Depends(get_current_user),
     db_client: AsyncIOMotorClient = Depends(get_database_client)
 ):
-    async with get_database_client() as client:
-        db = client.notes_db
-        lobby = await db.lobbies.find_one({"_id": ObjectId(lobby_id)})
+    async with get_database_client():
+        lobby = await lobbies_repo.get(lobby_id)
 
         if not lobby:
             raise HTTPException(status_code=404, detail="Lobby not found")
@@ -120,7 +127,7 @@ async def delete_lobby(
         if lobby.get("password") != password:
             raise HTTPException(status_code=403, detail="Incorrect password")
 
-        result = await db.lobbies.delete_one({"_id": ObjectId(lobby_id)})
+        result = await lobbies_repo.delete(lobby_id)
         if result.deleted_count == 0:
             raise HTTPException(status_code=500, detail="Lobby deletion failed")
 
@@ -128,13 +135,19 @@ async def delete_lobby(
 
 @router.get("/lobbies")
 async def get_all_lobbies(
+    http_response: Response,
+    if_none_match: Optional[str] = Header(None),
     current_user: User = Depends(get_current_user),
     db_client: AsyncIOMotorClient = Depends(get_database_client)
 ):
-    async with get_database_client() as client:
-        db = client.notes_db
-        lobbies_cursor = db.lobbies.find({})
-        lobbies = await lobbies_cursor.to_list(length=None)
+    async with get_database_client():
+        # Check (lobby_id, version) pairs first; the full listing is only read when something changed.
+        etag = make_etag("lobbies", await lobbies_repo.list_versions())
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        set_etag(http_response, etag)
+
+        lobbies = await lobbies_repo.list_all()
         return [
             {
                 "lobby_id": str(lobby["_id"]),
@@ -158,16 +171,13 @@ async def increment_user_count(
     lobby_id: str,
     db_client: AsyncIOMotorClient = Depends(get_database_client)
 ):
-    async with get_database_client() as client:
-        db = client.notes_db
-        result = await db.lobbies.update_one(
-            {"_id": ObjectId(lobby_id)},
-            {"$inc": {"user_count": 1}}
-        )
+    async with get_database_client():
+        result = await lobbies_repo.increment_user_count(lobby_id)
         if result.matched_count == 0:
             raise HTTPException(status_code=404, detail="Lobby not found")
         if result.modified_count == 0:
             raise HTTPException(status_code=500, detail="Failed to increment user count")
+        hub.publish_soon(lobby_id, {"type": "user_count_incremented"})
         return {"message": "User count incremented successfully"}
 
 @router.put("/lobbies/{lobby_id}/update-settings")
@@ -177,11 +187,9 @@ async def update_lobby_settings(
     current_user: User = Depends(get_current_user),
     db_client: AsyncIOMotorClient = Depends(get_database_client)
 ):
-    async with get_database_client() as client:
-        db = client.notes_db
-        
+    async with get_database_client():
         # First check if the lobby exists
-        lobby = await db.lobbies.find_one({"_id": ObjectId(lobby_id)})
+        lobby = await lobbies_repo.get(lobby_id)
         if not lobby:
             raise HTTPException(status_code=404, detail="Lobby not found")
         
@@ -193,17 +201,18 @@ async def update_lobby_settings(
             )
         
         # Update only the advanced_settings field
-        result = await db.lobbies.update_one(
-            {"_id": ObjectId(lobby_id)},
-            {"$set": {"advanced_settings": settings_data.get("advanced_settings")}}
-        )
+        result = await lobbies_repo.update_settings(lobby_id, settings_data.get("advanced_settings"))
         
         if result.modified_count == 0:
             raise HTTPException(status_code=500, detail="Failed to update lobby settings")
         
         # Fetch the updated lobby to return
-        updated_lobby = await db.lobbies.find_one({"_id": ObjectId(lobby_id)})
-        
+        updated_lobby = await lobbies_repo.get(lobby_id)
+        hub.publish_soon(lobby_id, {
+            "type": "lobby_settings_updated",
+            "advanced_settings": updated_lobby.get("advanced_settings")
+        })
+
         return {
             "message": "Lobby settings updated successfully",
             "advanced_settings": updated_lobby.get("advanced_settings")
@@ -1,24 +1,45 @@
-from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form
+from fastapi import APIRouter, Depends, HTTPException, File, UploadFile, Form, Header, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 from motor.motor_asyncio import AsyncIOMotorClient
 from typing import Optional, List, Dict, Any
-from app.db import get_database_client
-from app.extract import extract_key_concepts
-import PyPDF2
+from app.db import get_database_client, get_db_metrics
+from app.repositories import notes_repo, concepts_repo, analysis_results_repo, detailed_analyses_repo
+from app.gemini_batch import load_backend, analyze_class_batch, build_class_context
+from app.events import hub
+from app.export import iter_export_ndjson
+from app.etag import make_etag, etag_matches, not_modified, set_etag
+from app.routes.auth import get_current_user, User
+from app.admission import charge_admission, claim_expensive_slot, admission_stats
+from app.pdf_extract import extract_pdf_text
+from app.extract import extract_key_concepts, align_concepts
+from app.embeddings import embedding_stats
 import google.generativeai as genai
 import os
 import json
 from dotenv import load_dotenv
-import io
 import re
+import asyncio
+import uuid
+import base64
+from bson import ObjectId
+from bson.errors import InvalidId
 
 # Configure Gemini API – only if key is available
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
 if GEMINI_API_KEY:
     genai.configure(api_key=GEMINI_API_KEY)
 
+# How long analyze-concepts-enhanced waits for Gemini before answering with the local
+# analysis (milliseconds). 0 waits for Gemini as before.
+GEMINI_DEADLINE_MS = int(os.environ.get("GEMINI_DEADLINE_MS", "0"))
+
 router = APIRouter()
 
+# Strong references to in-flight Gemini enrichments so they are not garbage collected
+_background_tasks = set()
+
 # --- Pydantic model for updating notes (e.g., with High Note enhanced content) ---
 class NotePayload(BaseModel):
     user_id: str
@@ -38,31 +59,14 @@ async def submit_note(
     # If a PDF file is provided, extract its text and use that as content.
     if pdf_file:
         pdf_bytes = await pdf_file.read()
-        reader = PyPDF2.PdfReader(io.BytesIO(pdf_bytes))
-        extracted_text = ""
-        for page in reader.pages:
-            page_text = page.extract_text()
-            if page_text:
-                extracted_text += page_text + "\n"
-        # Optionally log the extracted text for debugging.
-        print("Extracted text: ", extracted_text)
-        # Clean up the extracted text by replacing multiple whitespace characters with a single space.
-        note_content = re.sub(r'\s+', ' ', extracted_text).strip()
+        # Cached by content hash, so a handout already uploaded by a classmate is not parsed again.
+        note_content = await extract_pdf_text(pdf_bytes)
     else:
         note_content = content
 
-    async with get_database_client() as client:
-        db = client.notes_db
-        note_data = {
-            "user_id": user_id,
-            "content": note_content,
-            "class_id": class_id
-        }
-        result = await db.notes.update_one(
-            {"user_id": user_id, "class_id": class_id},
-            {"$set": note_data},
-            upsert=True
-        )
+    async with get_database_client():
+        result = await notes_repo.upsert_note(user_id, class_id, note_content)
+        hub.publish_soon(class_id, {"type": "note_submitted", "user_id": user_id})
         return {
             "message": "Note submitted or updated successfully",
             "modified_count": result.modified_count,
@@ -90,21 +94,19 @@ async def update_student_concepts(
     similarity_method = payload.similarity_method
     # … Rest of the logic remains
 
-    async with db_client as client:
-        db = client.notes_db
+    async with db_client:
         # Retrieve all notes for the specified student and class.
-        notes_docs = await db.notes.find({"user_id": user_id, "class_id": class_id}).to_list(length=None)
+        notes_docs = await notes_repo.find_for_student(user_id, class_id)
         if not notes_docs:
             raise HTTPException(status_code=404, detail="No notes found for this student and class.")
 
         aggregated_text = " ".join([doc["content"] for doc in notes_docs if "content" in doc])
-        concepts = extract_key_concepts(aggregated_text, num_concepts, similarity_threshold, similarity_method)
-
-        await db.student_concepts.update_one(
-            {"user_id": user_id, "class_id": class_id},
-            {"$set": {"concepts": concepts}},
-            upsert=True
+        # Run extraction off the event loop so concurrent requests can share embedding batches.
+        concepts = await run_in_threadpool(
+            extract_key_concepts, aggregated_text, num_concepts, similarity_threshold, similarity_method
         )
+
+        await concepts_repo.set_concepts(user_id, class_id, concepts)
         return {
             "message": "Student concepts updated successfully.",
             "user_id": user_id,
@@ -112,25 +114,6 @@ async def update_student_concepts(
             "concepts": concepts
         }
 
-# -------------------------------------------------------------------
-# Import sentence_transformers and initialize the model once.
-from sentence_transformers import SentenceTransformer, util
-model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
-
-def find_common_concepts(student_concepts: List[str], other_concepts: List[str], sim_threshold: float = 0.8) -> List[str]:
-    """
-    Compare two lists of concept phrases semantically and return a list of common concepts
-    based on a cosine similarity threshold.
-    """
-    common = set()
-    student_embeddings = model.encode(student_concepts, convert_to_tensor=True)
-    other_embeddings = model.encode(other_concepts, convert_to_tensor=True)
-    for idx, student_emb in enumerate(student_embeddings):
-        cosine_scores = util.cos_sim(student_emb, other_embeddings)
-        if cosine_scores.max().item() >= sim_threshold:
-            common.add(student_concepts[idx])
-    return list(common)
-
 # -------------------------------------------------------------------
 async def apply_gemini_filter(result: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -166,9 +149,11 @@ async def apply_gemini_filter(result: Dict[str, Any]) -> Dict[str, Any]:
 
         Keep it concise and factual.
         """
-        response = gemini_model.generate_content(prompt)
+        # Run the blocking SDK call off the event loop so deadlines can fire while it is in flight.
+        response = await run_in_threadpool(gemini_model.generate_content, prompt)
         try:
-            gemini_data = json.loads(response.text)
+            # Gemini often wraps JSON in a ```json code fence.
+            gemini_data = json.loads(re.sub(r"^\s*```(?:json)?\s*|\s*```\s*$", "", response.text))
             if "learningGaps" in gemini_data and gemini_data["learningGaps"]:
                 result["missing_concepts"] = gemini_data["learningGaps"]
                 result["original_missing_concepts"] = missing_concepts
@@ -180,34 +165,94 @@ async def apply_gemini_filter(result: Dict[str, Any]) -> Dict[str, Any]:
             result["gemini_raw_response"] = response.text
         return result
     except Exception as e:
+        # Transient (network, quota, timeout): flagged so the result is not cached.
         result["gemini_analysis_error"] = str(e)
+        result["gemini_status"] = "error"
         return result
 
+async def _finish_gemini_enrichment(analysis_id: str, user_id: str, class_id: str, gemini_task: asyncio.Task):
+    """
+    Wait for a Gemini enrichment that missed its deadline, store the final result and
+    push it to the student's lobby subscribers.
+    """
+    try:
+        enriched = await gemini_task
+        status = "complete"
+    except Exception as e:
+        print(f"Background Gemini enrichment {analysis_id} failed: {e}")
+        enriched = {"gemini_analysis_error": str(e)}
+        status = "error"
+    await analysis_results_repo.complete(analysis_id, enriched, status=status)
+    hub.publish_soon(class_id, {
+        "type": "analysis_ready",
+        "analysis_id": analysis_id,
+        "status": status,
+        "result": enriched
+    }, only_user=user_id)
+
+
+async def apply_gemini_with_deadline(result: Dict[str, Any], user_id: str, class_id: str, deadline_ms: int) -> Dict[str, Any]:
+    """
+    Give Gemini `deadline_ms` to enrich the result. If it is slower, return the local
+    analysis immediately and let the enrichment finish in the background; the final
+    result can be fetched from /analysis-results/{analysis_id}.
+    """
+    gemini_task = asyncio.create_task(apply_gemini_filter(dict(result)))
+    done, _ = await asyncio.wait({gemini_task}, timeout=deadline_ms / 1000.0)
+    if done:
+        return gemini_task.result()
+
+    analysis_id = uuid.uuid4().hex
+    await analysis_results_repo.create_pending(analysis_id, user_id, class_id, result)
+    finisher = asyncio.create_task(_finish_gemini_enrichment(analysis_id, user_id, class_id, gemini_task))
+    _background_tasks.add(finisher)
+    finisher.add_done_callback(_background_tasks.discard)
+
+    print(f"Gemini missed the {deadline_ms} ms deadline; returning local analysis {analysis_id}")
+    return {**result, "analysis_id": analysis_id, "gemini_status": "pending"}
+
 # -------------------------------------------------------------------
 # /analyze-concepts-enhanced endpoint: Extract and compare student and other students’ concepts.
 @router.get("/analyze-concepts-enhanced")
 async def analyze_concepts_enhanced(
     user_id: str,
     class_id: str,
+    request: Request,
+    http_response: Response,
     num_concepts: Optional[int] = 10,
     similarity_threshold: Optional[float] = 0.75,
     similarity_method: Optional[str] = "string",  # may be unused with semantic compare
     sim_threshold: float = 0.8,  # threshold for common concepts using semantic similarity
+    missing_threshold: Optional[float] = None,  # class concept counts as missing below this (defaults to sim_threshold)
+    extra_threshold: Optional[float] = None,  # student concept counts as extra below this (defaults to sim_threshold)
     use_gemini: bool = True,
+    gemini_deadline_ms: Optional[int] = None,  # overrides GEMINI_DEADLINE_MS; 0 waits for Gemini
+    if_none_match: Optional[str] = Header(None),
+    current_user: User = Depends(get_current_user),
     db_client: AsyncIOMotorClient = Depends(get_database_client)
 ):
-    async with db_client as client:
-        db = client.notes_db
-
-        other_notes_docs = await db.notes.find({
-            "class_id": class_id,
-            "user_id": {"$ne": user_id}
-        }).to_list(length=None)
-
-        student_notes_docs = await db.notes.find({
-            "class_id": class_id,
-            "user_id": user_id
-        }).to_list(length=None)
+    async with db_client:
+        # The analysis only changes when a note in the class does (or the parameters do),
+        # so a client holding a current copy gets a 304 before any extraction runs.
+        etag = make_etag(
+            "analysis",
+            await notes_repo.versions_for_class(class_id, analysis=True),
+            user_id, class_id, num_concepts, similarity_threshold, similarity_method,
+            sim_threshold, missing_threshold, extra_threshold, use_gemini, bool(GEMINI_API_KEY)
+        )
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        if if_none_match:
+            # AdmissionMiddleware left conditional requests uncharged until we know extraction has to run:
+            # charge the buckets, then wait for an analysis slot like any other analysis request.
+            charge_admission(current_user.username)
+            await claim_expensive_slot(request)
+
+        # Analysis reads tolerate slightly stale data and may be served by secondaries.
+        other_notes_docs, student_notes_docs = await asyncio.gather(
+            notes_repo.find_for_class_excluding(class_id, user_id, analysis=True),
+            notes_repo.find_for_student(user_id, class_id, analysis=True)
+        )
 
         if not other_notes_docs:
             raise HTTPException(status_code=404, detail="No notes found from other students.")
@@ -222,29 +267,55 @@ async def analyze_concepts_enhanced(
 
         # Extract concepts using your extraction function;
         # In the merged version, you may pass class_size if your function supports it.
-        other_concepts = extract_key_concepts(aggregated_other_text, num_concepts, similarity_threshold, similarity_method, class_size)
-        student_concepts = extract_key_concepts(aggregated_student_text, num_concepts, similarity_threshold, similarity_method, class_size)
-
-        common_concepts = find_common_concepts(student_concepts, other_concepts, sim_threshold=sim_threshold)
+        # Both extractions run concurrently in the threadpool so their encode calls can be batched together.
+        other_concepts, student_concepts = await asyncio.gather(
+            run_in_threadpool(extract_key_concepts, aggregated_other_text, num_concepts, similarity_threshold, similarity_method, class_size),
+            run_in_threadpool(extract_key_concepts, aggregated_student_text, num_concepts, similarity_threshold, similarity_method, class_size)
+        )
 
-        missing_concepts = list(set(other_concepts) - set(student_concepts))
-        extra_concepts = list(set(student_concepts) - set(other_concepts))
+        # One similarity matrix drives common, missing and extra so the three lists agree.
+        alignment = await run_in_threadpool(
+            align_concepts, student_concepts, other_concepts, sim_threshold, missing_threshold, extra_threshold
+        )
 
         result = {
             "other_students_concepts": other_concepts,
             "student_concepts": student_concepts,
-            "missing_concepts": missing_concepts,
-            "extra_concepts": extra_concepts,
-            "common_concepts": common_concepts
+            "missing_concepts": alignment["missing_concepts"],
+            "extra_concepts": alignment["extra_concepts"],
+            "common_concepts": alignment["common_concepts"],
+            "match_scores": alignment["match_scores"]
         }
         if use_gemini:
             print("Applying Gemini filter")
-            result = await apply_gemini_filter(result)
+            deadline_ms = GEMINI_DEADLINE_MS if gemini_deadline_ms is None else gemini_deadline_ms
+            if deadline_ms > 0:
+                result = await apply_gemini_with_deadline(result, user_id, class_id, deadline_ms)
+            else:
+                result = await apply_gemini_filter(result)
         print("Result: ", result)
+        # A result still waiting on Gemini, or whose Gemini call failed transiently, is not
+        # cached; the client should ask again. Answers such as "no learning gaps" are cached.
+        if result.get("gemini_status") not in ("pending", "error"):
+            set_etag(http_response, etag)
+        hub.publish_soon(class_id, {"type": "analysis_ready", "result": result}, only_user=user_id)
         return result
 
 # -------------------------------------------------------------------
-#
+# /analysis-results/{analysis_id} endpoint: Fetch an analysis whose Gemini enrichment finished in the background.
+@router.get("/analysis-results/{analysis_id}")
+async def get_analysis_result(analysis_id: str):
+    async with get_database_client():
+        stored = await analysis_results_repo.get(analysis_id)
+        if not stored:
+            raise HTTPException(status_code=404, detail="Analysis result not found or expired.")
+        return {
+            "analysis_id": analysis_id,
+            "user_id": stored.get("user_id"),
+            "class_id": stored.get("class_id"),
+            "status": stored.get("status"),
+            "result": stored.get("result", {})
+        }
 
 # -------------------------------------------------------------------
 # /get-student-notes endpoint: Retrieve all notes for a given student and class.
@@ -254,12 +325,8 @@ async def get_student_notes(
     class_id: str,
     db_client: AsyncIOMotorClient = Depends(get_database_client)
 ):
-    async with get_database_client() as client:
-        db = client.notes_db
-        notes = await db.notes.find({
-            "user_id": user_id,
-            "class_id": class_id
-        }).to_list(length=None)
+    async with get_database_client():
+        notes = await notes_repo.find_for_student(user_id, class_id)
         if not notes:
             raise HTTPException(status_code=404, detail="No notes found for this student and class.")
         return {
@@ -268,6 +335,74 @@ async def get_student_notes(
 
 # -------------------------------------------------------------------
 
+# -------------------------------------------------------------------
+# /search endpoint: Ranked full-text search over a class's notes with snippets and cursor pagination.
+def _encode_search_cursor(score: float, note_id: ObjectId) -> str:
+    raw = json.dumps([score, str(note_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_search_cursor(cursor: str):
+    try:
+        score, note_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), ObjectId(note_id)
+    except (ValueError, TypeError, InvalidId):
+        raise HTTPException(status_code=400, detail="Invalid search cursor.")
+
+
+@router.get("/search")
+async def search_notes(
+    class_id: str,
+    q: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    db_client: AsyncIOMotorClient = Depends(get_database_client)
+):
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Search query must not be empty.")
+    limit = max(1, min(limit, 100))
+    after = _decode_search_cursor(cursor) if cursor else None
+    # Centre snippets on the first search term (negated terms are skipped).
+    terms = [t.strip("\"'.,;:!?") for t in q.lower().split() if not t.startswith("-")]
+    snippet_term = next((t for t in terms if t), "")
+
+    async with db_client:
+        # Fetch one extra hit to know whether another page exists.
+        hits = await notes_repo.search(class_id, q, limit + 1, after, snippet_term)
+
+    has_more = len(hits) > limit
+    hits = hits[:limit]
+    results = []
+    for hit in hits:
+        snippet = hit.get("snippet", "")
+        if hit.get("snippet_start", 0) > 0:
+            snippet = "…" + snippet
+        if hit.get("snippet_start", 0) + len(hit.get("snippet", "")) < hit.get("content_length", 0):
+            snippet = snippet + "…"
+        results.append({
+            "note_id": str(hit["_id"]),
+            "user_id": hit.get("user_id"),
+            "score": hit.get("score"),
+            "snippet": snippet
+        })
+    return {
+        "class_id": class_id,
+        "query": q,
+        "results": results,
+        "next_cursor": _encode_search_cursor(hits[-1]["score"], hits[-1]["_id"]) if has_more else None
+    }
+
+# -------------------------------------------------------------------
+# /export endpoint: Stream a class's notes and concepts as NDJSON with constant memory.
+# Use `python -m app.export` for all classes, .npy embeddings and bulk import.
+@router.get("/export")
+async def export_class(class_id: str):
+    return StreamingResponse(
+        iter_export_ndjson(class_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="{class_id}.ndjson"'}
+    )
+
 # -------------------------------------------------------------------
 # /detailed-note-analysis endpoint: Provide detailed analysis of a student's notes versus other students' notes using Gemini.
 @router.get("/detailed-note-analysis")
@@ -288,20 +423,12 @@ async def detailed_note_analysis(
             detail="Gemini API key not configured. Please add GEMINI_API_KEY to your environment variables."
         )
     try:
-        async with db_client as client:
-            db = client.notes_db
-
-            student_notes = await db.notes.find({
-                "user_id": user_id,
-                "class_id": class_id
-            }).to_list(length=None)
+        async with db_client:
+            student_notes = await notes_repo.find_for_student(user_id, class_id, analysis=True)
             if not student_notes:
                 raise HTTPException(status_code=404, detail="No notes found for this student in this class.")
 
-            other_students_notes = await db.notes.find({
-                "class_id": class_id,
-                "user_id": {"$ne": user_id}
-            }).to_list(length=None)
+            other_students_notes = await notes_repo.find_for_class_excluding(class_id, user_id, analysis=True)
             if not other_students_notes:
                 print("No other students' notes found for comparison. Proceeding with analysis of just this student's notes.")
                 other_students_notes = []
@@ -311,8 +438,7 @@ async def detailed_note_analysis(
             other_content = " ".join([note["content"] for note in other_students_notes if "content" in note])
             print(f"Other students' content length: {len(other_content)}")
 
-            student_concepts_doc = await db.student_concepts.find_one({"user_id": user_id, "class_id": class_id})
-            student_concepts = student_concepts_doc.get("concepts", []) if student_concepts_doc else []
+            student_concepts = await concepts_repo.get_concepts(user_id, class_id)
             print(f"Student concepts: {student_concepts}")
 
             student_content_condensed = student_content[:3000] if len(student_content) > 3000 else student_content
@@ -433,6 +559,82 @@ async def detailed_note_analysis(
         }
 
 
+# -------------------------------------------------------------------
+# /class-detailed-analysis endpoint: Analyze every student in a class with batched Gemini requests.
+# The shared class dataset is sent once per batch instead of once per student.
+@router.post("/class-detailed-analysis")
+async def class_detailed_analysis(
+    class_id: str,
+    db_client: AsyncIOMotorClient = Depends(get_database_client)
+):
+    try:
+        backend = load_backend()
+    except (RuntimeError, ValueError) as e:  # missing API key / unknown GEMINI_BACKEND
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async with db_client:
+        class_notes, concepts_by_user = await asyncio.gather(
+            notes_repo.find_for_class(class_id, analysis=True),
+            concepts_repo.get_concepts_for_class(class_id)
+        )
+        if not class_notes:
+            raise HTTPException(status_code=404, detail="No notes found for this class.")
+
+        content_by_user: Dict[str, List[str]] = {}
+        for note in class_notes:
+            if "content" in note:
+                content_by_user.setdefault(note["user_id"], []).append(note["content"])
+        students = [
+            {"user_id": uid, "content": " ".join(contents), "concepts": concepts_by_user.get(uid, [])}
+            for uid, contents in sorted(content_by_user.items())
+        ]
+        # Concepts come from the full class text; the prompt gets a bounded slice of every student.
+        class_concepts = await run_in_threadpool(
+            extract_key_concepts, " ".join(student["content"] for student in students)
+        )
+        class_context = build_class_context(students)
+
+        results = await analyze_class_batch(class_context, class_concepts, students, backend)
+        documents = {
+            uid: {"student_id": uid, "class_id": class_id, **result}
+            for uid, result in results.items()
+        }
+        await detailed_analyses_repo.save_many(class_id, documents)
+        hub.publish_soon(class_id, {"type": "class_analysis_ready", "student_count": len(students)})
+        return {
+            "class_id": class_id,
+            "student_count": len(students),
+            "students": documents
+        }
+
+# -------------------------------------------------------------------
+# /detailed-analysis-result endpoint: Fetch one student's stored class batch analysis result.
+@router.get("/detailed-analysis-result")
+async def get_class_detailed_analysis(user_id: str, class_id: str):
+    async with get_database_client():
+        stored = await detailed_analyses_repo.get(user_id, class_id)
+        if not stored:
+            raise HTTPException(status_code=404, detail="No batch analysis found for this student and class.")
+        return stored
+
+# -------------------------------------------------------------------
+# /embedding-stats endpoint: Report the embedding backend and micro-batching histograms.
+@router.get("/embedding-stats")
+async def get_embedding_stats():
+    return embedding_stats()
+
+# -------------------------------------------------------------------
+# /db-stats endpoint: Report Mongo connection-pool checkout waits and query latencies.
+@router.get("/db-stats")
+async def get_db_stats():
+    return get_db_metrics()
+
+# -------------------------------------------------------------------
+# /admission-stats endpoint: Report token-bucket rejections and scheduler queue depth.
+@router.get("/admission-stats")
+async def get_admission_stats():
+    return admission_stats()
+
 # -------------------------------------------------------------------
 # /check-environment endpoint: Debug and report environment details.
 @router.get("/check-environment")
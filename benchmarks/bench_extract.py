@@ -0,0 +1,284 @@
+"""
+Offline benchmark for the concept-extraction pipeline in app/extract.py.
+
+Sweeps note size, class size and similarity method over a deterministic synthetic
+corpus and records wall time and peak Python memory per stage. Results are written
+as JSON so a run can be compared against a stored baseline:
+
+    python -m benchmarks.bench_extract --output bench.json
+    python -m benchmarks.bench_extract --save-baseline benchmarks/baseline.json
+    python -m benchmarks.bench_extract --baseline benchmarks/baseline.json --tolerance 0.2
+
+Peak memory comes from tracemalloc, which only sees Python allocations (not
+torch/onnxruntime buffers). It is measured in a separate run from the timings
+so tracing overhead does not distort them.
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List
+
+from rake_nltk import Rake
+from nltk.corpus import stopwords
+
+from app.extract import (
+    calculate_dynamic_threshold,
+    extract_key_concepts,
+    filter_similar_phrases,
+    find_common_concepts,
+)
+
+# -------------------------------------------------------------------
+# Synthetic corpus
+
+TOPICS = {
+    "biology": [
+        "photosynthesis", "chlorophyll", "light reactions", "calvin cycle", "cellular respiration",
+        "mitochondria", "atp synthesis", "glycolysis", "krebs cycle", "electron transport chain",
+        "dna replication", "transcription", "translation", "ribosomes", "enzymes",
+    ],
+    "physics": [
+        "newton's laws", "momentum", "kinetic energy", "potential energy", "conservation of energy",
+        "friction", "acceleration", "velocity", "projectile motion", "circular motion",
+        "torque", "angular momentum", "work energy theorem", "impulse", "gravitational force",
+    ],
+    "economics": [
+        "supply curve", "demand curve", "market equilibrium", "price elasticity", "opportunity cost",
+        "marginal utility", "comparative advantage", "inflation", "monetary policy", "fiscal policy",
+        "gross domestic product", "unemployment rate", "interest rates", "consumer surplus", "tariffs",
+    ],
+}
+
+CONNECTORS = [
+    "is closely related to", "depends on", "explains", "is an example of", "contrasts with",
+    "was discussed together with", "helps us understand", "is measured using", "leads to",
+]
+FILLER = [
+    "the lecture", "our textbook", "the professor", "this week", "the exam", "the lab",
+    "in class", "the homework", "the slides", "the review session",
+]
+
+
+def generate_note(rng: random.Random, topic: str, num_words: int) -> str:
+    """
+    Generate one student's note of roughly `num_words` words about `topic`.
+    """
+    terms = TOPICS[topic]
+    sentences = []
+    words = 0
+    while words < num_words:
+        sentence = (
+            f"{rng.choice(terms).capitalize()} {rng.choice(CONNECTORS)} {rng.choice(terms)} "
+            f"according to {rng.choice(FILLER)}."
+        )
+        sentences.append(sentence)
+        words += len(sentence.split())
+    return " ".join(sentences)
+
+
+def generate_class(seed: int, topic: str, class_size: int, words_per_note: int) -> List[str]:
+    """
+    Deterministic notes for a whole class (same seed -> same corpus).
+    """
+    rng = random.Random(f"{seed}-{topic}-{class_size}-{words_per_note}")
+    return [generate_note(rng, topic, words_per_note) for _ in range(class_size)]
+
+
+def rake_phrases(text: str) -> List[str]:
+    rake = Rake(stopwords=stopwords.words('english'))
+    rake.extract_keywords_from_text(text)
+    return [phrase for phrase in rake.get_ranked_phrases() if 3 <= len(phrase) <= 100]
+
+
+# -------------------------------------------------------------------
+# Measurement
+
+def measure(fn: Callable[[], Any], repeats: int) -> Dict[str, float]:
+    """
+    Time `fn` over `repeats` runs, then run it once more under tracemalloc for peak memory.
+    """
+    timings = []
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            fn()
+            timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "max_s": max(timings),
+        "peak_bytes": peak,
+    }
+
+
+def run_suite(
+    note_sizes: List[int],
+    class_sizes: List[int],
+    methods: List[str],
+    phrase_counts: List[int],
+    repeats: int,
+    seed: int,
+    topic: str
+) -> List[Dict[str, Any]]:
+    results = []
+
+    def record(stage: str, params: Dict[str, Any], fn: Callable[[], Any]):
+        metrics = measure(fn, repeats)
+        results.append({"stage": stage, "params": params, **metrics})
+        print(f"{stage:<24} {json.dumps(params, sort_keys=True):<70} {metrics['median_s'] * 1000:10.2f} ms "
+              f"{metrics['peak_bytes'] / 1024:10.1f} KiB", file=sys.stderr)
+
+    for words in note_sizes:
+        for class_size in class_sizes:
+            notes = generate_class(seed, topic, class_size, words)
+            class_text = " ".join(notes[1:]) or notes[0]
+            student_text = notes[0]
+            threshold = calculate_dynamic_threshold(len(class_text), class_size)
+
+            for method in methods:
+                params = {
+                    "words_per_note": words,
+                    "class_size": class_size,
+                    "method": method,
+                    "text_chars": len(class_text),
+                    "dynamic_threshold": round(threshold, 4),
+                }
+                record("extract_key_concepts", params, lambda: extract_key_concepts(
+                    class_text, 10, 0.75, method, class_size
+                ))
+
+            # Common-concept matching between one student and the rest of the class.
+            with contextlib.redirect_stdout(io.StringIO()):
+                student_concepts = extract_key_concepts(student_text, 10, 0.75, "string", class_size)
+                class_concepts = extract_key_concepts(class_text, 10, 0.75, "string", class_size)
+            record("find_common_concepts", {
+                "words_per_note": words,
+                "class_size": class_size,
+                "student_concepts": len(student_concepts),
+                "class_concepts": len(class_concepts),
+            }, lambda: find_common_concepts(student_concepts, class_concepts, 0.8))
+
+    # Phrase-count sweep for the O(n^2) similarity filter, independent of RAKE.
+    largest_text = " ".join(generate_class(seed, topic, max(class_sizes), max(note_sizes)))
+    phrases = rake_phrases(largest_text)
+    for count in phrase_counts:
+        subset = phrases[:count]
+        for method in methods:
+            record("filter_similar_phrases", {
+                "phrases": len(subset),
+                "method": method,
+            }, lambda: filter_similar_phrases(subset, 0.75, method))
+
+    return results
+
+
+# -------------------------------------------------------------------
+# Baseline comparison
+
+def result_key(result: Dict[str, Any]) -> str:
+    return result["stage"] + " " + json.dumps(result["params"], sort_keys=True)
+
+
+def compare_to_baseline(results: List[Dict[str, Any]], baseline: Dict[str, Any], tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Return the entries whose median time or peak memory regressed by more than `tolerance`.
+    """
+    baseline_by_key = {result_key(r): r for r in baseline.get("results", [])}
+    regressions = []
+    for result in results:
+        previous = baseline_by_key.get(result_key(result))
+        if previous is None:
+            continue
+        time_ratio = result["median_s"] / previous["median_s"] if previous["median_s"] else 1.0
+        memory_ratio = result["peak_bytes"] / previous["peak_bytes"] if previous["peak_bytes"] else 1.0
+        print(f"{result_key(result):<100} time x{time_ratio:5.2f}  memory x{memory_ratio:5.2f}", file=sys.stderr)
+        if time_ratio > 1 + tolerance or memory_ratio > 1 + tolerance:
+            regressions.append({
+                "key": result_key(result),
+                "time_ratio": time_ratio,
+                "memory_ratio": memory_ratio,
+            })
+    return regressions
+
+
+def parse_int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the concept-extraction pipeline")
+    parser.add_argument("--note-sizes", type=parse_int_list, default=[100, 500, 2000], help="words per note")
+    parser.add_argument("--class-sizes", type=parse_int_list, default=[1, 10, 30])
+    parser.add_argument("--methods", default="string,semantic")
+    parser.add_argument("--phrase-counts", type=parse_int_list, default=[10, 25, 50, 100])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--topic", choices=sorted(TOPICS), default="biology")
+    parser.add_argument("--quick", action="store_true", help="small sweep for a fast sanity check")
+    parser.add_argument("--output", help="write results JSON here (default: stdout)")
+    parser.add_argument("--save-baseline", help="also write results to this baseline file")
+    parser.add_argument("--baseline", help="compare against this baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        args.note_sizes, args.class_sizes, args.phrase_counts, args.repeats = [100, 500], [1, 10], [10, 25], 1
+
+    results = run_suite(
+        args.note_sizes,
+        args.class_sizes,
+        args.methods.split(","),
+        args.phrase_counts,
+        args.repeats,
+        args.seed,
+        args.topic
+    )
+    report = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "seed": args.seed,
+        "topic": args.topic,
+        "repeats": args.repeats,
+        "results": results,
+    }
+
+    payload = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(payload)
+    else:
+        print(payload)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(payload)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) beyond {args.tolerance:.0%}:", file=sys.stderr)
+            for regression in regressions:
+                print(f"  {regression['key']}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,35 @@
+from dotenv import load_dotenv
+
+# Load environment variables from .env file before importing app modules, which read
+# their configuration at import time
+load_dotenv()
+
 from fastapi import FastAPI, Depends
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from app.routes.routes import router as note_router
 from app.routes.lobby import router as lobby_router
 from app.routes.auth import router as auth_router, get_current_user
-from dotenv import load_dotenv
-import os
-
-# Load environment variables from .env file
-load_dotenv()
+from app.routes.events import router as events_router
+from app.admission import AdmissionMiddleware
+from app.profiling import ProfilingMiddleware, PROFILE_TOKEN
+from app.routes.admin import router as admin_router
+from app.embeddings import get_embedder
 
 app = FastAPI()
 
+# Load the embedding model before serving so the first analysis request does not pay for it
+@app.on_event("startup")
+async def load_embedding_model():
+    await run_in_threadpool(get_embedder)
+
+# On-demand per-request profiling; not installed at all unless PROFILE_TOKEN is set
+if PROFILE_TOKEN:
+    app.add_middleware(ProfilingMiddleware)
+
+# Priority scheduling / load shedding (registered first so CORS wraps its 429 responses)
+app.add_middleware(AdmissionMiddleware)
+
 # Configure CORS to allow requests from both frontend development origins
 app.add_middleware(
     CORSMiddleware,
@@ -24,6 +43,9 @@ app.add_middleware(
 app.include_router(auth_router, prefix="/auth", tags=["auth"])
 app.include_router(note_router, prefix="/notes", tags=["notes"], dependencies=[Depends(get_current_user)])
 app.include_router(lobby_router, prefix="/lobby", tags=["lobby"], dependencies=[Depends(get_current_user)])
+# WebSocket routes authenticate with a ?token= query parameter instead of the router dependency
+app.include_router(events_router, prefix="/events", tags=["events"])
+app.include_router(admin_router, prefix="/admin", tags=["admin"], dependencies=[Depends(get_current_user)])
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,73 @@
+import asyncio
+import json
+
+from app.gemini_batch import (
+    STUDENT_HEADER,
+    FakeGeminiBackend,
+    GeminiBackend,
+    analyze_class_batch,
+    parse_batch_response,
+)
+
+
+def make_students(count):
+    return [{"user_id": f"student{i}", "content": f"notes {i}", "concepts": ["photosynthesis"]} for i in range(count)]
+
+
+class DroppingBackend(FakeGeminiBackend):
+    """
+    Fake backend that leaves one student out of its answer.
+    """
+
+    def __init__(self, dropped: str):
+        super().__init__()
+        self.dropped = dropped
+
+    async def generate(self, prompt: str) -> str:
+        data = json.loads(await super().generate(prompt))
+        data["students"].pop(self.dropped, None)
+        return json.dumps(data)
+
+
+class FailingBackend(GeminiBackend):
+    name = "failing"
+
+    async def generate(self, prompt: str) -> str:
+        raise RuntimeError("quota exceeded")
+
+
+def test_students_are_chunked_by_batch_size():
+    backend = FakeGeminiBackend()
+    results = asyncio.run(analyze_class_batch("context", ["photosynthesis"], make_students(5), backend, batch_size=2))
+
+    assert len(backend.prompts) == 3
+    assert [prompt.count(STUDENT_HEADER) for prompt in backend.prompts] == [2, 2, 1]
+    assert sorted(results) == [f"student{i}" for i in range(5)]
+    assert all(result["status"] == "success" for result in results.values())
+
+
+def test_student_missing_from_response_is_partial_success():
+    backend = DroppingBackend("student1")
+    results = asyncio.run(analyze_class_batch("context", [], make_students(3), backend, batch_size=3))
+
+    assert results["student1"]["status"] == "partial_success"
+    assert "raw_analysis" in results["student1"]
+    assert results["student0"]["status"] == "success"
+    assert results["student2"]["status"] == "success"
+
+
+def test_backend_exception_marks_whole_chunk_as_error():
+    results = asyncio.run(analyze_class_batch("context", [], make_students(3), FailingBackend(), batch_size=2))
+
+    assert {user_id: result["status"] for user_id, result in results.items()} == {
+        "student0": "error",
+        "student1": "error",
+        "student2": "error",
+    }
+    assert results["student2"]["message"] == "quota exceeded"
+
+
+def test_parse_batch_response_handles_wrapped_and_invalid_json():
+    wrapped = '```json\n{"students": {"a": {"qualityAssessment": "ok"}}}\n```'
+    assert parse_batch_response(wrapped, ["a", "b"]) == {"a": {"qualityAssessment": "ok"}, "b": None}
+    assert parse_batch_response("not json", ["a"]) == {"a": None}